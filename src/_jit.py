@@ -0,0 +1,14 @@
+try:
+    from numba import njit, prange
+    from numba.typed import List
+    NUMBA_AVAILABLE = True
+except ImportError:     # numba is optional, the kernels then run as plain Python
+    NUMBA_AVAILABLE = False
+    prange = range
+    List = list
+
+    def njit(*args, **kwargs):
+        """Stand-in for numba.njit that returns the decorated function unchanged"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
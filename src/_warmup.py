@@ -0,0 +1,44 @@
+import numpy as np
+from ._jit import List, NUMBA_AVAILABLE
+
+def warmup():
+    """
+    Calls every compiled entry point once on a trivial input
+
+    The kernels have explicit signatures, so importing their modules already compiles them, or loads them
+    from the on-disk cache. Running this once after installing (python -m src._warmup) fills the cache, and
+    the calls start Numba's thread pool, so the first interactive pricing call pays for neither.
+    """
+    if not NUMBA_AVAILABLE:
+        return
+
+    from .models.binomial import _backward_induction_jit, _price_book_jit
+    from .models.monte_carlo import _mc_european, _price_book_mc
+    from .analysis._bs_numba import CALL, _iv_brent
+    from .analysis.iv_solver import iv_chain
+    from .option_class import option_book
+
+    # Read-only columns, as pandas hands out, so the conversion to the kernels' writable arrays is covered too
+    columns = {
+        name: np.full(1, value)
+        for name, value in (('price', 10.0), ('S', 100.0), ('K', 100.0), ('T', 1.0), ('sigma', 0.2), ('r', 0.05))
+    }
+    for column in columns.values():
+        column.flags.writeable = False
+    book = option_book({'option_type': 'call', **columns})
+    one = np.ones(1)
+    rngs = List([np.random.default_rng(0)])
+
+    _backward_induction_jit(True, True, 100.0, 100.0, 2, 1.1, 0.9, 0.5, 0.99)
+    _price_book_jit(book['is_call'], True, book['S'], book['K'], 2, 1.1 * one, 0.9 * one, 0.5 * one, 0.99 * one)
+
+    _mc_european(100.0, 100.0, 0.05, 0.0, 0.2, 1.0, 16, True, True, True, rngs, 16)
+    _price_book_mc(
+        book['S'], book['K'], book['r'], book['q'], book['sigma'], book['T'], book['is_call'], 16, True, True, rngs
+    )
+
+    iv_chain(columns['price'], columns['K'], 100.0, 1.0, 0.05, max_iterations=10, max_workers=1)
+    _iv_brent(CALL, 10.0, 100.0, 100.0, 1.0, 0.05, 0.0, 1e-6, 5.0, -10.0, 80.0, 1e-6, 10)
+
+if __name__ == "__main__":
+    warmup()
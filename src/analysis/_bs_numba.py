@@ -0,0 +1,175 @@
+import math
+import warnings
+from .._jit import njit, NUMBA_AVAILABLE
+
+CALL = 1
+PUT = 0
+
+_SQRT_2 = math.sqrt(2)
+_INV_SQRT_2PI = 1 / math.sqrt(2 * math.pi)
+
+@njit("f8(f8)", cache=True, fastmath=True, nogil=True)
+def _norm_cdf(x):
+    """Standard normal cumulative distribution function"""
+    return 0.5 * math.erfc(-x / _SQRT_2)
+
+@njit("f8(f8)", cache=True, fastmath=True, nogil=True)
+def _norm_pdf(x):
+    """Standard normal probability density function"""
+    return _INV_SQRT_2PI * math.exp(-0.5 * x * x)
+
+@njit("UniTuple(f8, 3)(i8, f8, f8, f8, f8, f8, f8)", cache=True, fastmath=True, nogil=True)
+def _bs_price_vega_vomma(flag, S, K, T, sigma, r, q):
+    """
+    Calculate the Black-Scholes price, vega and vomma of a European option in a single pass
+
+    :param flag: CALL or PUT
+    """
+    if T <= 0:
+        if flag == CALL:
+            return max(S - K, 0.0), 0.0, 0.0
+        return max(K - S, 0.0), 0.0, 0.0
+
+    sqrtT = math.sqrt(T)
+    sigma_sqrtT = sigma * sqrtT
+    d1 = (math.log(S / K) + (r - q + 0.5 * sigma * sigma) * T) / sigma_sqrtT
+    d2 = d1 - sigma_sqrtT
+
+    disc_q = S * math.exp(-q * T)
+    disc_r = K * math.exp(-r * T)
+
+    if flag == CALL:
+        price = disc_q * _norm_cdf(d1) - disc_r * _norm_cdf(d2)
+    else:
+        price = disc_r * _norm_cdf(-d2) - disc_q * _norm_cdf(-d1)
+
+    vega = disc_q * _norm_pdf(d1) * sqrtT
+    return price, vega, vega * d1 * d2 / sigma
+
+@njit("Tuple((f8, b1))(i8, f8, f8, f8, f8, f8, f8, f8, f8, i8, f8, f8)", cache=True, fastmath=True, nogil=True)
+def _iv_newton(flag, market_price, S, K, T, r, q, sigma, tolerance, max_iterations, lower_vol, upper_vol):
+    """
+    Solve for the implied volatility, clamping sigma to [lower_vol, upper_vol]
+
+    Takes Halley steps using vomma, falling back to a plain Newton-Raphson step where the
+    second order correction would dominate the step.
+
+    :return: The implied volatility and whether the solver converged
+    """
+    for _ in range(max_iterations):
+        price, vega, vomma = _bs_price_vega_vomma(flag, S, K, T, sigma, r, q)
+        diff = price - market_price
+
+        if abs(diff) < tolerance:
+            return sigma, True
+
+        if abs(vega) < 1e-8:
+            break
+
+        if abs(vomma) * abs(diff) > 2 * vega * vega:
+            sigma -= diff / vega
+        else:
+            sigma -= 2 * diff * vega / (2 * vega * vega - diff * vomma)
+
+        sigma = min(max(sigma, lower_vol), upper_vol)
+
+    return sigma, False
+
+@njit(
+    "void(i8, f8[::1], f8[::1], b1[::1], f8, f8, f8, f8, f8, f8, i8, f8, f8, f8[::1])",
+    cache=True, fastmath=True, nogil=True
+)
+def _iv_newton_chunk(flag, market_prices, strikes, valid, S, T, r, q, sigma, tolerance, max_iterations, lower_vol, upper_vol, out):
+    """Solve for the implied volatility of each valid strike, writing converged solutions into out"""
+    for i in range(len(strikes)):
+        if valid[i]:
+            implied_vol, converged = _iv_newton(
+                flag, market_prices[i], S, strikes[i], T, r, q, sigma, tolerance, max_iterations, lower_vol, upper_vol
+            )
+
+            if converged:
+                out[i] = implied_vol
+
+@njit("Tuple((f8, b1))(i8, f8, f8, f8, f8, f8, f8, f8, f8, f8, f8, f8, i8)", cache=True, fastmath=True, nogil=True)
+def _iv_brent(flag, market_price, S, K, T, r, q, lower_vol, upper_vol, f_lower, f_upper, tolerance, max_iterations):
+    """
+    Solve for the implied volatility with Brent's method, following scipy's brentq
+
+    The objective values at the bracket ends are passed in since the caller has already
+    evaluated them to check that the bracket contains a root.
+
+    :return: The implied volatility and whether the solver converged
+    """
+    rtol = 4 * 2.220446049250313e-16
+    x_pre, x_cur = lower_vol, upper_vol
+    f_pre, f_cur = f_lower, f_upper
+    x_blk, f_blk = 0.0, 0.0
+    s_pre, s_cur = 0.0, 0.0
+
+    if f_pre == 0:
+        return x_pre, True
+    if f_cur == 0:
+        return x_cur, True
+
+    for _ in range(max_iterations):
+        if f_pre != 0 and f_cur != 0 and (f_pre < 0) != (f_cur < 0):
+            x_blk, f_blk = x_pre, f_pre
+            s_pre = s_cur = x_cur - x_pre
+
+        if abs(f_blk) < abs(f_cur):
+            x_pre, x_cur, x_blk = x_cur, x_blk, x_cur
+            f_pre, f_cur, f_blk = f_cur, f_blk, f_cur
+
+        delta = (tolerance + rtol * abs(x_cur)) / 2
+        s_bis = (x_blk - x_cur) / 2
+
+        if f_cur == 0 or abs(s_bis) < delta:
+            return x_cur, True
+
+        if abs(s_pre) > delta and abs(f_cur) < abs(f_pre):
+            if x_pre == x_blk:      # secant interpolation
+                s_try = -f_cur * (x_cur - x_pre) / (f_cur - f_pre)
+            else:                   # inverse quadratic extrapolation
+                d_pre = (f_pre - f_cur) / (x_pre - x_cur)
+                d_blk = (f_blk - f_cur) / (x_blk - x_cur)
+                s_try = -f_cur * (f_blk * d_blk - f_pre * d_pre) / (d_blk * d_pre * (f_blk - f_pre))
+
+            if 2 * abs(s_try) < min(abs(s_pre), 3 * abs(s_bis) - delta):
+                s_pre, s_cur = s_cur, s_try
+            else:
+                s_pre = s_cur = s_bis
+        else:
+            s_pre = s_cur = s_bis
+
+        x_pre, f_pre = x_cur, f_cur
+        if abs(s_cur) > delta:
+            x_cur += s_cur
+        else:
+            x_cur += delta if s_bis > 0 else -delta
+
+        f_cur = _bs_price_vega_vomma(flag, S, K, T, x_cur, r, q)[0] - market_price
+
+    return x_cur, False
+
+def _kernel_matches_scipy():
+    """Checks the compiled kernel against scipy on a short-dated at-the-money option"""
+    from scipy.special import ndtr
+
+    S, K, T, sigma, r, q = 100.0, 100.0, 7 / 365, 0.2, 0.05, 0.0
+    sqrtT = math.sqrt(T)
+    d1 = (math.log(S / K) + (r - q + 0.5 * sigma**2) * T) / (sigma * sqrtT)
+    d2 = d1 - sigma * sqrtT
+    expected_price = S * math.exp(-q * T) * ndtr(d1) - K * math.exp(-r * T) * ndtr(d2)
+    expected_vega = S * math.exp(-q * T) * math.exp(-0.5 * d1**2) / math.sqrt(2 * math.pi) * sqrtT
+
+    price, vega, _ = _bs_price_vega_vomma(CALL, S, K, T, sigma, r, q)
+    return math.isclose(price, expected_price, rel_tol=1e-9) and math.isclose(vega, expected_vega, rel_tol=1e-9)
+
+if NUMBA_AVAILABLE and not _kernel_matches_scipy():
+    warnings.warn("Numba Black-Scholes kernel disagrees with scipy, falling back to plain Python kernels")
+    _norm_cdf = _norm_cdf.py_func
+    _norm_pdf = _norm_pdf.py_func
+    _bs_price_vega_vomma = _bs_price_vega_vomma.py_func
+    _iv_newton = _iv_newton.py_func
+    _iv_newton_chunk = _iv_newton_chunk.py_func
+    _iv_brent = _iv_brent.py_func
@@ -1,53 +1,144 @@
+from dataclasses import replace
 from ..option_class import Option
-from ..models.binomial import Binomial
+from ..models.binomial import Binomial, _array_module
+from ..models.black_scholes import BlackScholes
 
 class FiniteDifferenceGreeks:
-    def __init__(self, option: Option, option_style: str, N: int = 1_000):
+    BATCH_MODELS = {
+        Binomial._crr_model: "crr",
+        Binomial._jr_model: "jr",
+        Binomial._lr_model: "lr"
+    }
+
+    def __init__(self, option: Option, option_style: str, N: int = 1_000, backend: str = "numpy"):
+        """
+        Initialise the finite difference greeks calculator
+
+        :param backend: Array library for the batched bumped trees, numpy or cupy (GPU, worthwhile for large N)
+        """
+        _array_module(backend)      # fail early if cupy is requested but not installed
+
         self.option = option
         self.option_style = option_style
         self.N = N
+        self.backend = backend
+
+    def _price(self, price_func, **bumps):
+        """
+        Prices a single bumped tree with a custom pricing function
+
+        :param price_func: The binomial pricing model
+        :param bumps: The bumped parameters (S, T, sigma or r)
+        """
+        return price_func(Binomial(replace(self.option, **bumps), self.option_style, self.N))
 
-    def _price(self, price_func, S=None, T=None, sigma=None, r=None):
-        option = Option(
-            self.option.option_type,
-            S if S is not None else self.option.S,
-            self.option.K,
-            T if T is not None else self.option.T,
-            sigma if sigma is not None else self.option.sigma,
-            r if r is not None else self.option.r,
-            self.option.q
-        )
+    def _price_batch(self, price_func, bumps):
+        """
+        Prices every bumped tree in one batched rollback
 
-        model = Binomial(option, self.option_style, self.N)
-        return price_func(model)
+        :param price_func: The binomial pricing model
+        :param bumps: List of dicts of the bumped parameters (S, T, sigma, r) for each tree
+        """
+        model = self.BATCH_MODELS.get(price_func)
+
+        if model is None:
+            return [self._price(price_func, **bump) for bump in bumps]
+
+        params = {
+            name: [bump.get(name, getattr(self.option, name)) for bump in bumps]
+            for name in ('S', 'T', 'sigma', 'r')
+        }
+
+        return Binomial(self.option, self.option_style, self.N).price_batch(model, **params, backend=self.backend)
 
     def fd_delta(self, price_func, h):
-        price_up = self._price(price_func, S=self.option.S + h)
-        price_down = self._price(price_func, S=self.option.S - h)
+        price_up, price_down = self._price_batch(price_func, [
+            {'S': self.option.S + h},
+            {'S': self.option.S - h}
+        ])
 
         return (price_up - price_down) / (2 * h)
 
     def fd_gamma(self, price_func, h):
-        price_up = self._price(price_func, S=self.option.S + h)
-        price_mid = self._price(price_func, S=self.option.S)
-        price_down = self._price(price_func, S=self.option.S - h)
+        price_up, price_mid, price_down = self._price_batch(price_func, [
+            {'S': self.option.S + h},
+            {},
+            {'S': self.option.S - h}
+        ])
 
         return (price_up - 2 * price_mid + price_down) / (h**2)
 
+    def _is_european(self):
+        """Checks if the option is European, where vega has a closed form"""
+        return self.option_style.lower() == "european"
+
     def fd_vega(self, price_func, h):
-        price_up = self._price(price_func, sigma=self.option.sigma + h)
-        price_down = self._price(price_func, sigma=self.option.sigma - h)
+        if self._is_european():     # closed form, no trees needed
+            return BlackScholes(self.option).vega()
+
+        price_up, price_down = self._price_batch(price_func, [
+            {'sigma': self.option.sigma + h},
+            {'sigma': self.option.sigma - h}
+        ])
 
         return (price_up - price_down) / (2 * h)
 
     def fd_theta(self, price_func, h):
-        price_up = self._price(price_func, T=self.option.T + h)
-        price_down = self._price(price_func, T=self.option.T - h)
+        price_up, price_down = self._price_batch(price_func, [
+            {'T': self.option.T + h},
+            {'T': self.option.T - h}
+        ])
 
         return (price_up - price_down) / (2 * h)
 
     def fd_rho(self, price_func, h):
-        price_up = self._price(price_func, r=self.option.r + h)
-        price_down = self._price(price_func, r=self.option.r - h)
+        price_up, price_down = self._price_batch(price_func, [
+            {'r': self.option.r + h},
+            {'r': self.option.r - h}
+        ])
 
         return (price_up - price_down) / (2 * h)
+
+    def fd_all_greeks(self, price_func, h_S, h_sigma, h_T, h_r=None):
+        """
+        Calculates all the finite difference greeks from a single batch of bumped trees
+
+        The unbumped price is shared by gamma, the rho trees are skipped when h_r is None, and
+        European options take the closed-form vega instead of the volatility trees.
+
+        :param price_func: The binomial pricing model
+        :param h_S: Bump size for the stock price (delta and gamma)
+        :param h_sigma: Bump size for the volatility (vega)
+        :param h_T: Bump size for the time to maturity (theta)
+        :param h_r: Bump size for the risk-free rate (rho)
+        """
+        bumps = {
+            'center': {},
+            'S_up': {'S': self.option.S + h_S},
+            'S_down': {'S': self.option.S - h_S},
+            'T_up': {'T': self.option.T + h_T},
+            'T_down': {'T': self.option.T - h_T}
+        }
+
+        if not self._is_european():
+            bumps['sigma_up'] = {'sigma': self.option.sigma + h_sigma}
+            bumps['sigma_down'] = {'sigma': self.option.sigma - h_sigma}
+
+        if h_r is not None:
+            bumps['r_up'] = {'r': self.option.r + h_r}
+            bumps['r_down'] = {'r': self.option.r - h_r}
+
+        prices = dict(zip(bumps, self._price_batch(price_func, list(bumps.values()))))
+
+        greeks = {
+            'Delta': (prices['S_up'] - prices['S_down']) / (2 * h_S),
+            'Gamma': (prices['S_up'] - 2 * prices['center'] + prices['S_down']) / (h_S**2),
+            'Vega': self.fd_vega(price_func, h_sigma) if self._is_european()
+                    else (prices['sigma_up'] - prices['sigma_down']) / (2 * h_sigma),
+            'Theta': (prices['T_up'] - prices['T_down']) / (2 * h_T)
+        }
+
+        if h_r is not None:
+            greeks['Rho'] = (prices['r_up'] - prices['r_down']) / (2 * h_r)
+
+        return greeks
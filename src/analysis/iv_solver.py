@@ -1,6 +1,7 @@
-from scipy.optimize import brentq
-from ..option_class import Option
-from ..models.black_scholes import BlackScholes
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from ._bs_numba import CALL, PUT, _bs_price_vega_vomma, _iv_newton, _iv_newton_chunk, _iv_brent
 
 class ImpliedVolatilitySolver:
     VALID_OPTION_TYPES = {'call', 'put'}
@@ -67,52 +68,103 @@ class ImpliedVolatilitySolver:
         if self.tolerance < 0:
             raise ValueError("Tolerance must be greater than or equal to 0")
 
+    def _flag(self):
+        """Kernel flag for the option type"""
+        return CALL if self.option_type == "call" else PUT
+
     def iv_newton_raphson(self, sigma=0.2):
         """
         Calculate the implied volatility of the option using Newton-Raphson method
         
         :param sigma: Initial sigma with which to iterate through
         """
-        option = Option(self.option_type, self.S, self.K, self.T, sigma, self.r, self.q)
-        bs = BlackScholes(option)
-
-        for _ in range(self.max_iterations):
-            bs.option.sigma = sigma
-            price = bs.price()
-            vega = bs.vega()
-
-            diff = price - self.market_price
-
-            if abs(diff) < self.tolerance:
-                self.sigma = sigma
-                return sigma
+        sigma, converged = _iv_newton(
+            self._flag(), float(self.market_price), float(self.S), float(self.K), float(self.T), float(self.r), float(self.q),
+            float(sigma), float(self.tolerance), int(self.max_iterations), float(self.lower_vol), float(self.upper_vol)
+        )
 
-            if abs(vega) < 1e-8:
-                break
-
-            sigma -= diff / vega
-            sigma = min(max(sigma, self.lower_vol), self.upper_vol)
+        if not converged:
+            print("Newton-Rapshon implied volatility did not converge")
+            return None
 
-        print("Newton-Rapshon implied volatility did not converge")
-        return None
+        self.sigma = sigma
+        return sigma
 
     def iv_brent(self):
         """Calculate the implied volatility of the option using Brent's method"""
-        option = Option(self.option_type, self.S, self.K, self.T, 0.1, self.r, self.q)
-        bs = BlackScholes(option)
+        flag = self._flag()
+        S, K, T, r, q = float(self.S), float(self.K), float(self.T), float(self.r), float(self.q)
+        lower_vol, upper_vol = float(self.lower_vol), float(self.upper_vol)
 
-        def objective(sigma):
-            bs.option.sigma = sigma
-            return bs.price() - self.market_price
-
-        lower = objective(self.lower_vol)
-        upper = objective(self.upper_vol)
+        lower = _bs_price_vega_vomma(flag, S, K, T, lower_vol, r, q)[0] - self.market_price
+        upper = _bs_price_vega_vomma(flag, S, K, T, upper_vol, r, q)[0] - self.market_price
 
         if lower * upper > 0:
             print(f"No roots exist in volatility range: [{self.lower_vol}, {self.upper_vol}]")
             return None
 
-        implied_vol = brentq(objective, self.lower_vol, self.upper_vol, maxiter=self.max_iterations, xtol=self.tolerance)
+        implied_vol, converged = _iv_brent(
+            flag, float(self.market_price), S, K, T, r, q, lower_vol, upper_vol,
+            lower, upper, float(self.tolerance), int(self.max_iterations)
+        )
+
+        if not converged:
+            raise RuntimeError(f"Brent's method failed to converge after {self.max_iterations} iterations")
 
         self.sigma = implied_vol
-        return implied_vol
\ No newline at end of file
+        return implied_vol
+
+def iv_chain(
+        market_prices,
+        strikes,
+        S: float,
+        T: float,
+        r: float,
+        q: float = 0,
+        option_type: str = "call",
+        sigma: float = 0.2,
+        lower_vol: float = 1e-6,
+        upper_vol: float = 5,
+        max_iterations: int = 100,
+        tolerance: float = 1e-6,
+        max_workers: int = None
+    ):
+    """
+    Calculate the implied volatility at every strike of a chain using Newton-Raphson method
+
+    The strikes are split into chunks that are solved on a thread pool. The compiled kernel
+    releases the GIL, so the chunks run in parallel.
+
+    :param market_prices: Market price of the option at each strike
+    :param strikes: Strike prices
+    :param option_type: Call or put
+    :param sigma: Initial sigma with which to iterate through
+    :param max_workers: Number of threads, defaults to the number of CPUs
+    :return: Array of implied volatilities, NaN where there is no valid price or the solver did not converge
+    """
+    if option_type not in ImpliedVolatilitySolver.VALID_OPTION_TYPES:
+        raise ValueError(f"Invalid option type '{option_type}'. Must be {ImpliedVolatilitySolver.VALID_OPTION_TYPES}")
+
+    market_prices = np.require(market_prices, float, ['C', 'W'])     # pandas columns are read-only views
+    strikes = np.require(strikes, float, ['C', 'W'])
+    valid = np.isfinite(market_prices) & (market_prices > 0) & np.isfinite(strikes) & (strikes > 0)
+    implied_vols = np.full(len(strikes), np.nan)
+
+    flag = CALL if option_type == "call" else PUT
+    max_workers = max_workers or os.cpu_count() or 1
+    bounds = np.linspace(0, len(strikes), min(max_workers, max(len(strikes), 1)) + 1).astype(int)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(
+                _iv_newton_chunk, flag, market_prices[start:end], strikes[start:end], valid[start:end],
+                float(S), float(T), float(r), float(q), float(sigma), float(tolerance), int(max_iterations),
+                float(lower_vol), float(upper_vol), implied_vols[start:end]
+            )
+            for start, end in zip(bounds[:-1], bounds[1:])
+        ]
+
+        for future in futures:
+            future.result()
+
+    return implied_vols
@@ -1,44 +1,50 @@
+import math
 import numpy as np
+import pandas as pd
 from ..option_class import Option
-from ..models.black_scholes import BlackScholes
+from ..models.black_scholes import BlackScholes, price_chain
 
 class ArbitrageDetector:
     def __init__(self, transaction_cost=0.0, min_threshold=0.01):
         self.min_threshold = min_threshold
         self.transaction_cost = transaction_cost
 
-    def put_call_parity(self, C, P, S, K, T, r):
-        lhs = C + K * np.exp(-r * T)
-        rhs = P + S
+    def _parity_numeric(self, C, P, S, K, T, r):
+        """Calculates the put-call parity mispricing and profit, element-wise for arrays of options"""
+        discounted_strike = K * np.exp(-r * T)
 
-        diff = lhs - rhs
-        transaction_cost = self.transaction_cost * (C + P + S + K * np.exp(-r * T))
-        profit = abs(diff) - transaction_cost
+        diff = (C + discounted_strike) - (P + S)
+        transaction_cost = self.transaction_cost * (C + P + S + discounted_strike)
+        profit = np.abs(diff) - transaction_cost
+
+        return diff, profit, profit >= self.min_threshold
 
+    def _parity_format(self, C, P, K, T, r, diff, profit, arbitrage_exists):
+        """Describes the put-call parity result of a single strike"""
         arbitrage = {
             'call price': float(C),
             'put price': float(P),
-            'arbitrage exists': bool(profit >= self.min_threshold),
+            'arbitrage exists': bool(arbitrage_exists),
             'profit': float(profit),
         }
 
-        if profit >= self.min_threshold and diff > 0:
+        if arbitrage_exists and diff > 0:
             arbitrage['strategy'] = 'Conversion (call is overpriced)'
             arbitrage['details'] = {
                 'action': [
                     'Buy 1 put option',
                     'Buy 1 share of stock',
                     'Sell 1 call option',
-                    f'Lend ${K * np.exp(-r * T):.2f} at risk-free rate {r * 100:.2f}%'
+                    f'Lend ${K * math.exp(-r * T):.2f} at risk-free rate {r * 100:.2f}%'
                 ],
                 'Initial Inflow': float(diff)
             }
-        elif profit >= self.min_threshold and diff < 0:
+        elif arbitrage_exists and diff < 0:
             arbitrage['strategy'] = 'Reverse conversion (put is overpriced)'
             arbitrage['details'] = {
                 'action': [
                     'Buy 1 call option',
-                    f'Borrow ${K * np.exp(-r * T):.2f} at risk-free rate {r * 100:.2f}%',
+                    f'Borrow ${K * math.exp(-r * T):.2f} at risk-free rate {r * 100:.2f}%',
                     'Sell 1 put option',
                     'Sell 1 share of stock',
                 ],
@@ -47,10 +53,52 @@ class ArbitrageDetector:
 
         return arbitrage
 
-    def box_spread(self, C1, C2, P1, P2, K1, K2, T, r):
-        if K1 >= K2:
+    def put_call_parity(self, C, P, S, K, T, r):
+        diff, profit, arbitrage_exists = self._parity_numeric(C, P, S, K, T, r)
+        return self._parity_format(C, P, K, T, r, diff, profit, arbitrage_exists)
+
+    def detect_chain(self, option_chain, S, T, r):
+        """
+        Check put-call parity at every strike of an option chain
+
+        The parity check runs on whole columns at once and only the strikes with an arbitrage are
+        described with a strategy.
+
+        :param option_chain: Option chain with 'callPrice', 'strike' and 'putPrice' columns
+        :param S: Current stock price
+        :param T: Time to maturity in years
+        :param r: Risk-free rate
+        """
+        option_chain = option_chain.dropna(subset=['callPrice', 'putPrice'])
+        C = option_chain['callPrice'].to_numpy(dtype=float)
+        P = option_chain['putPrice'].to_numpy(dtype=float)
+        K = option_chain['strike'].to_numpy(dtype=float)
+
+        diff, profit, arbitrage_exists = self._parity_numeric(C, P, S, K, T, r)
+
+        strategies = np.full(len(K), None, dtype=object)
+        details = np.full(len(K), None, dtype=object)
+
+        for i in np.flatnonzero(arbitrage_exists):
+            arbitrage = self._parity_format(C[i], P[i], K[i], T, r, diff[i], profit[i], True)
+            strategies[i] = arbitrage.get('strategy')
+            details[i] = arbitrage.get('details')
+
+        return pd.DataFrame({
+            'strike': K,
+            'call price': C,
+            'put price': P,
+            'arbitrage exists': arbitrage_exists,
+            'profit': profit,
+            'strategy': strategies,
+            'details': details,
+        })
+
+    def _box_numeric(self, C1, C2, P1, P2, K1, K2, T, r):
+        """Calculates the box spread mispricing and profit, element-wise for arrays of strike pairs"""
+        if np.any(np.asarray(K1) >= np.asarray(K2)):
             raise ValueError("K1 must be strictly less than K2")
-        if T <= 0:
+        if np.any(np.asarray(T) <= 0):
             raise ValueError("Time to maturity must be positive")
 
         initial_cost = (C1 - C2) + (P2 - P1)
@@ -58,14 +106,18 @@ class ArbitrageDetector:
 
         diff = np.exp(-r * T) * payoff_maturity - initial_cost
         transaction_cost = self.transaction_cost * (C1 + C2 + P1 + P2)
-        profit = abs(diff) - transaction_cost
+        profit = np.abs(diff) - transaction_cost
+
+        return initial_cost, payoff_maturity, diff, profit, profit >= self.min_threshold
 
+    def _box_format(self, K1, K2, initial_cost, payoff_maturity, diff, profit, arbitrage_exists):
+        """Describes the box spread result of a single strike pair"""
         arbitrage = {
-            'arbitrage exists': bool(profit >= self.min_threshold),
+            'arbitrage exists': bool(arbitrage_exists),
             'profit (pv)': float(profit)
         }
 
-        if profit >= self.min_threshold and diff > 0:
+        if arbitrage_exists and diff > 0:
             arbitrage['strategy'] = 'Buy the box'
             arbitrage['details'] = {
                 'action at time 0': [
@@ -77,7 +129,7 @@ class ArbitrageDetector:
                 'Initial Outflow': float(initial_cost),
                 'Payoff at maturity': float(payoff_maturity)
             }
-        elif profit >= self.min_threshold and diff < 0:
+        elif arbitrage_exists and diff < 0:
             arbitrage['strategy'] = 'Sell the box'
             arbitrage['details'] = {
                 'action at time 0': [
@@ -92,6 +144,43 @@ class ArbitrageDetector:
 
         return arbitrage
 
+    def box_spread(self, C1, C2, P1, P2, K1, K2, T, r):
+        initial_cost, payoff_maturity, diff, profit, arbitrage_exists = self._box_numeric(C1, C2, P1, P2, K1, K2, T, r)
+        return self._box_format(K1, K2, initial_cost, payoff_maturity, diff, profit, arbitrage_exists)
+
+    def detect_box_chain(self, option_chain, T, r):
+        """
+        Check box spreads between every pair of adjacent strikes of an option chain
+
+        :param option_chain: Option chain with 'callPrice', 'strike' and 'putPrice' columns
+        :param T: Time to maturity in years
+        :param r: Risk-free rate
+        """
+        option_chain = option_chain.dropna(subset=['callPrice', 'putPrice']).sort_values('strike')
+        C = option_chain['callPrice'].to_numpy(dtype=float)
+        P = option_chain['putPrice'].to_numpy(dtype=float)
+        K = option_chain['strike'].to_numpy(dtype=float)
+
+        C1, C2, P1, P2, K1, K2 = C[:-1], C[1:], P[:-1], P[1:], K[:-1], K[1:]
+        initial_cost, payoff_maturity, diff, profit, arbitrage_exists = self._box_numeric(C1, C2, P1, P2, K1, K2, T, r)
+
+        strategies = np.full(len(K1), None, dtype=object)
+        details = np.full(len(K1), None, dtype=object)
+
+        for i in np.flatnonzero(arbitrage_exists):
+            arbitrage = self._box_format(K1[i], K2[i], initial_cost[i], payoff_maturity[i], diff[i], profit[i], True)
+            strategies[i] = arbitrage.get('strategy')
+            details[i] = arbitrage.get('details')
+
+        return pd.DataFrame({
+            'K1': K1,
+            'K2': K2,
+            'arbitrage exists': arbitrage_exists,
+            'profit (pv)': profit,
+            'strategy': strategies,
+            'details': details,
+        })
+
     def market_price_vs_bs_price(self, market_price, option: Option):
         bs_option = BlackScholes(option)
         bs_price = bs_option.price()
@@ -130,20 +219,52 @@ class ArbitrageDetector:
 
         return arbitrage
 
+    def market_price_vs_bs_chain(self, calls, puts, S, T, r, q=0):
+        """
+        Compare market prices against Black-Scholes prices for every option in a chain at once
+
+        :param calls: Call options with 'strike', 'price' and 'impliedVolatility' columns
+        :param puts: Put options with 'strike', 'price' and 'impliedVolatility' columns
+        :param S: Current stock price
+        :param T: Time to maturity in years
+        :param r: Risk-free rate
+        :param q: Dividend yield rate
+        """
+        calls, puts = price_chain(calls, puts, S, T, r, q)
+        chain = pd.concat([calls.assign(optionType='call'), puts.assign(optionType='put')], ignore_index=True)
+
+        market_price = chain['price'].to_numpy()
+        bs_price = chain['bsPrice'].to_numpy()
+        delta = chain['delta'].to_numpy()
+
+        diff = market_price - bs_price
+        transaction_cost = self.transaction_cost * (market_price + np.abs(delta) * S)
+        profit = np.abs(diff) - transaction_cost
+
+        return pd.DataFrame({
+            'option type': chain['optionType'].to_numpy(),
+            'strike': chain['strike'].to_numpy(),
+            'market price': market_price,
+            'black-scholes price': bs_price,
+            'delta': delta,
+            'arbitrage exists': profit >= self.min_threshold,
+            'profit': profit,
+        })
+
     def check_option_bounds(self, option_price, option_style, option_type: str, S, K, T, r, q=0):
         option_type = option_type.lower()
 
         transaction_cost = self.transaction_cost * option_price
 
         if option_type == "call":
-            lower_bound = max(0, S * np.exp(-q * T) - K * np.exp(-r * T))
-            upper_bound = S * np.exp(-q * T)
+            lower_bound = max(0, S * math.exp(-q * T) - K * math.exp(-r * T))
+            upper_bound = S * math.exp(-q * T)
         else:   # option_type = "put"
             if option_style == "european":
-                lower_bound = max(0, K * np.exp(-r * T) - S * np.exp(-q * T))
-                upper_bound = K * np.exp(-r * T)
+                lower_bound = max(0, K * math.exp(-r * T) - S * math.exp(-q * T))
+                upper_bound = K * math.exp(-r * T)
             elif option_style == "american":
-                lower_bound = max(0, K - S * np.exp(-q * T))
+                lower_bound = max(0, K - S * math.exp(-q * T))
                 upper_bound = K
 
         arbitrage = {
@@ -1,13 +1,22 @@
 import yfinance as yf
+import numpy as np
 import pandas as pd
 from datetime import datetime
+from functools import cached_property
 from .option_class import Option
+from .models.black_scholes import price_chain
 
 class StockOptionsData:
     def __init__(self, ticker: str):
         self.ticker = ticker.upper()
         self.stock = yf.Ticker(ticker)
-        self.data = self.stock.history(period="1d")
+
+        # Fetch the stock and treasury histories in one request
+        history = yf.download([self.ticker, "^TNX"], period="5d", group_by="ticker", progress=False, threads=True)
+        self.data = history[self.ticker].dropna(how="all")
+        self._treasury_data = history["^TNX"].dropna(how="all")
+        self._option_chains = {}
+        self._options_by_strike = {}
 
         self._validate_ticker()
 
@@ -22,13 +31,17 @@ class StockOptionsData:
     def get_stock_price(self):
         return self.data["Close"].iloc[-1]
 
-    def get_expirations(self):
+    @cached_property
+    def _expirations(self):
         expirations = self.stock.options
         self._validate_options(expirations)
         return list(expirations)
 
+    def get_expirations(self):
+        return list(self._expirations)
+
     def _validate_expiration_date(self, expiration_date):
-        expirations = self.get_expirations()
+        expirations = self._expirations
 
         if expiration_date is None:
             return expirations[0]
@@ -37,64 +50,83 @@ class StockOptionsData:
         else:
             return expiration_date
 
+    def _option_chain(self, expiration_date):
+        """Fetches the calls and puts for an expiration date, only hitting the network once per date"""
+        if expiration_date not in self._option_chains:
+            option_chain = self.stock.option_chain(expiration_date)
+            self._option_chains[expiration_date] = (option_chain.calls, option_chain.puts)
+
+        return self._option_chains[expiration_date]
+
+    @staticmethod
+    def _prepare_options(options):
+        """Keeps only the columns used downstream, with float32 prices, volumes and implied volatilities"""
+        bid = options['bid'].to_numpy(dtype=np.float32)
+        ask = options['ask'].to_numpy(dtype=np.float32)
+        price = np.add(bid, ask)
+        price *= 0.5    # mid price
+
+        return pd.DataFrame({
+            'strike': options['strike'].to_numpy(dtype=np.float64),
+            'price': price,
+            'bid': bid,
+            'ask': ask,
+            'volume': options['volume'].to_numpy(dtype=np.float32),
+            'openInterest': options['openInterest'].to_numpy(dtype=np.float32),
+            'impliedVolatility': options['impliedVolatility'].to_numpy(dtype=np.float32)
+        })
+
     def get_call_options(self, expiration_date=None):
         expiration_date = self._validate_expiration_date(expiration_date)
-        calls = self.stock.option_chain(expiration_date).calls
-        calls = calls.rename(columns={
-            'lastPrice': 'price'
-        })
-        calls['price'] = (calls['bid'] + calls['ask']) / 2
-        return calls
+        calls, _ = self._option_chain(expiration_date)
+        return self._prepare_options(calls)
 
     def get_put_options(self, expiration_date=None):
         expiration_date = self._validate_expiration_date(expiration_date)
-        puts = self.stock.option_chain(expiration_date).puts
-        puts = puts.rename(columns={
-            'lastPrice': 'price'
-        })
-        puts['price'] = (puts['bid'] + puts['ask']) / 2
-        return puts
+        _, puts = self._option_chain(expiration_date)
+        return self._prepare_options(puts)
 
-    def get_option_chain(self, expiration_date=None):
+    def get_option_chain(self, expiration_date=None, bs_price=False):
         calls = self.get_call_options(expiration_date)
         puts = self.get_put_options(expiration_date)
-
-        option_chain = pd.merge(
-            calls[['strike', 'price', 'bid', 'ask', 'volume', 'openInterest', 'impliedVolatility']],
-            puts[['strike', 'price', 'bid', 'ask', 'volume', 'openInterest', 'impliedVolatility']],
-            on='strike',
-            how='outer',
-            suffixes=('_call', '_put')
-        )
-
-        option_chain = option_chain.rename(columns={
-            'price_call': 'callPrice',
-            'price_put': 'putPrice',
-            'bid_call': 'callBid',
-            'bid_put': 'putBid',
-            'ask_call': 'callAsk',
-            'ask_put': 'putAsk',
-            'volume_call': 'callVolume',
-            'volume_put': 'putVolume',
-            'openInterest_call': 'callOpenInterest',
-            'openInterest_put': 'putOpenInterest',
-            'impliedVolatility_call': 'callImpliedVolatility',
-            'impliedVolatility_put': 'putImpliedVolatility',
+        columns = {
+            'Price': 'price',
+            'Bid': 'bid',
+            'Ask': 'ask',
+            'Volume': 'volume',
+            'OpenInterest': 'openInterest',
+            'ImpliedVolatility': 'impliedVolatility',
+        }
+
+        if bs_price:
+            S = self.get_stock_price()
+            T = self.calculate_time_to_maturity(expiration_date)
+            r = self.get_risk_free_rate()
+            q = self.get_dividend_yield()
+            calls, puts = price_chain(calls, puts, S, T, r, q)
+            columns['BSPrice'] = 'bsPrice'
+
+        calls = calls.set_index('strike')
+        puts = puts.set_index('strike')
+        strikes = calls.index.union(puts.index)
+
+        option_chain = pd.DataFrame({
+            **{f'call{name}': calls[column].reindex(strikes).to_numpy() for name, column in columns.items()},
+            'strike': strikes.to_numpy(),
+            **{f'put{name}': puts[column].reindex(strikes).to_numpy() for name, column in columns.items()},
         })
 
-        option_chain = option_chain[[
-            'callPrice', 'callBid', 'callAsk', 'callVolume', 'callOpenInterest', 'callImpliedVolatility', 'strike',
-            'putPrice', 'putBid', 'putAsk', 'putVolume', 'putOpenInterest', 'putImpliedVolatility'
-        ]]
-
         return option_chain
 
+    @cached_property
+    def _risk_free_rate(self):
+        return self._treasury_data["Close"].iloc[-1] / 100
+
     def get_risk_free_rate(self):
-        treasury = yf.Ticker("^TNX")
-        data = treasury.history(period="5d")
-        return data["Close"].iloc[-1] / 100
+        return self._risk_free_rate
 
-    def get_dividend_yield(self):
+    @cached_property
+    def _dividend_yield(self):
         info = self.stock.info
 
         if 'dividendYield' in info and info['dividendYield'] is not None:
@@ -102,6 +134,9 @@ class StockOptionsData:
 
         return 0
 
+    def get_dividend_yield(self):
+        return self._dividend_yield
+
     def calculate_time_to_maturity(self, expiration_date=None):
         expiration_date = self._validate_expiration_date(expiration_date)
         exp_date = datetime.strptime(expiration_date, '%Y-%m-%d')
@@ -132,31 +167,39 @@ class StockOptionsData:
             }
         }, option_chain
 
-    def _get_strike_prices(self, option_chain):
-        return list(option_chain.strike)
+    def _get_options_by_strike(self, option_type, expiration_date=None):
+        """Gets the call or put options indexed by strike, building the index once per expiration date"""
+        expiration_date = self._validate_expiration_date(expiration_date)
+        key = (option_type.lower(), expiration_date)
 
-    def get_relevant_options_data(self, option_type, strike=None, expiration_date=None):
-        S = self.get_stock_price()
+        if key not in self._options_by_strike:
+            if key[0] == "call":
+                option_chain = self.get_call_options(expiration_date)
+            elif key[0] == "put":
+                option_chain = self.get_put_options(expiration_date)
+            else:
+                raise ValueError(f"Invalid option type {option_type}, must be 'call' or 'put'")
 
-        if option_type.lower() == "call":
-            option_chain = self.get_call_options(expiration_date)
-        elif option_type.lower() == "put":
-            option_chain = self.get_put_options(expiration_date)
-        else:
-            raise ValueError(f"Invalid option type {option_type}, must be 'call' or 'put'")
+            self._options_by_strike[key] = option_chain.set_index('strike')
 
-        strikes = self._get_strike_prices(option_chain)
+        return self._options_by_strike[key]
+
+    def get_relevant_options_data(self, option_type, strike=None, expiration_date=None):
+        S = self.get_stock_price()
+        option_chain = self._get_options_by_strike(option_type, expiration_date)
 
         if strike is None:
-            strike = strikes[0]
-        elif strike not in strikes:
-            raise ValueError(f"Invalid strike {strike}. Valid strikes: {strikes}")
+            strike = option_chain.index[0]
+        elif strike not in option_chain.index:
+            raise ValueError(f"Invalid strike {strike}. Valid strikes: {list(option_chain.index)}")
+
+        row = option_chain.loc[strike]
 
         K = strike
         T = self.calculate_time_to_maturity(expiration_date)
         r = self.get_risk_free_rate()
-        sigma = option_chain.loc[option_chain['strike'] == K, 'impliedVolatility'].iloc[0]
+        sigma = float(row['impliedVolatility'])
         q = self.get_dividend_yield()
 
-        market_price = option_chain.loc[option_chain['strike'] == K, 'price'].iloc[0]
+        market_price = float(row['price'])
         return Option(option_type, S, K, T, sigma, r, q), market_price
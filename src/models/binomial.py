@@ -1,6 +1,275 @@
+import math
 import numpy as np
-from ..option_class import Option
-from .black_scholes import BlackScholes
+from functools import lru_cache
+from .._jit import njit, prange, NUMBA_AVAILABLE
+from ..option_class import Option, option_book
+
+# Trees of at least TILED_MIN_STEPS steps are rolled back in tiles of TILE_SIZE nodes and time steps,
+# below that both layers stay in cache anyway and the plain sweep is as fast
+TILE_SIZE = 1_024
+TILED_MIN_STEPS = 50_000
+
+def _array_module(backend):
+    """Returns the array module for a backend, importing CuPy only when it is requested"""
+    if backend == "numpy":
+        return np
+    if backend == "cupy":
+        try:
+            import cupy
+        except ImportError as e:
+            raise ImportError("The cupy backend requires CuPy to be installed") from e
+        return cupy
+    raise ValueError(f"Invalid backend '{backend}'. Must be ['numpy', 'cupy']")
+
+def _peizer_pratt_inversion(z, N):
+    """Evaluates the Peizer-Pratt function for a given scalar parameter z"""
+    c = z / (N + 1/3 + 0.1/(N + 1))
+    return 0.5 + 0.5 * math.copysign(math.sqrt(1 - math.exp(-(c * c) * (N + 1/6))), z)
+
+@lru_cache(maxsize=64)
+def _tree_params(model, sigma, T, r, q, N, S=None, K=None):
+    """
+    Calculates the up move, down move, risk-neutral probability and per-step discount factor of a tree
+
+    Only the Leisen-Reimer tree depends on S and K, so the other models leave them out of the cache key.
+
+    :param model: The binomial model (crr, jr or lr)
+    :param N: The number of time steps
+    """
+    dt = T / N
+    sqrt_dt = math.sqrt(dt)
+
+    if model == "crr":
+        u = math.exp(sigma * sqrt_dt)
+        d = 1 / u
+        p = (math.exp((r - q) * dt) - d) / (u - d)
+    elif model == "jr":
+        p = 0.5
+        u = math.exp((r - q - 0.5 * sigma**2) * dt + sigma * sqrt_dt)
+        d = math.exp((r - q - 0.5 * sigma**2) * dt - sigma * sqrt_dt)
+    else:   # model == "lr"
+        # d1 and d2 share sigma * sqrt(T), so it is computed once
+        sigma_sqrtT = sigma * math.sqrt(T)
+        d1 = (math.log(S / K) + (r - q + 0.5 * sigma**2) * T) / sigma_sqrtT
+        d2 = d1 - sigma_sqrtT
+
+        p = _peizer_pratt_inversion(d2, N)
+        p_prime = _peizer_pratt_inversion(d1, N)
+
+        growth = math.exp((r - q) * dt)
+        u = growth * p_prime / p
+        d = growth * (1 - p_prime) / (1 - p)
+
+    return u, d, p, math.exp(-r * dt)
+
+def _backward_induction_vec(option_type, option_style, S, K, N, u, d, p, disc, buffers):
+    """
+    Calculates the price of an option discounting backwards through the tree, one NumPy operation per time step
+
+    :param u: The up move of the stock price
+    :param d: The down move of the stock price
+    :param p: The risk-neutral probability
+    :param disc: The discount factor over one time step
+    :param buffers: Scratch array of shape (3, N + 1) that is overwritten
+    """
+    ST, payoffs, scratch = buffers[0], buffers[1], buffers[2]
+
+    # Terminal stock prices as a running product of u / d, avoiding N + 1 powers
+    ST[0] = S * d**N
+    ST[1:] = u / d
+    np.cumprod(ST, out=ST)
+
+    if option_type == "call":
+        np.subtract(ST, K, out=payoffs)
+    else:   # option_type == "put"
+        np.subtract(K, ST, out=payoffs)
+    np.maximum(payoffs, 0, out=payoffs)
+
+    # Roll back inside the same buffers, the live part of the tree shrinking by one node per step
+    one_minus_p = 1 - p
+    inv_d = 1 / d
+
+    for step in range(N - 1, -1, -1):
+        continuation = payoffs[:step + 1]
+        up = scratch[:step + 1]
+
+        np.multiply(payoffs[1:step + 2], p, out=up)
+        continuation *= one_minus_p
+        continuation += up
+        continuation *= disc
+
+        if option_style == "american":
+            stock = ST[:step + 1]
+            stock *= inv_d  # Stock prices at time previous step
+
+            if option_type == "call":
+                np.subtract(stock, K, out=up)
+            else:   # option_type == "put"
+                np.subtract(K, stock, out=up)
+
+            np.maximum(continuation, up, out=continuation)
+
+    return payoffs[0]
+
+@njit(cache=True, fastmath=True, nogil=True)
+def _rollback_nodes(is_call, is_american, K, p, one_minus_p, disc, inv_d, ST, payoffs, lo, hi):
+    """
+    Moves nodes lo to hi - 1 back by one time step in place, reading node hi from the later step
+
+    Indexing views that start at lo keeps the indices non-negative, so the loop still vectorises.
+    """
+    V = payoffs[lo:hi + 1]
+    X = ST[lo:hi]
+
+    for i in range(hi - lo):
+        continuation = disc * (p * V[i + 1] + one_minus_p * V[i])
+
+        if is_american:
+            X[i] *= inv_d   # Stock price at the previous step
+            exercise = X[i] - K if is_call else K - X[i]
+            V[i] = max(exercise, continuation)
+        else:
+            V[i] = continuation
+
+@njit("f8(b1, b1, f8, f8, i8, f8, f8, f8, f8)", cache=True, fastmath=True, nogil=True)
+def _backward_induction_jit(is_call, is_american, S, K, N, u, d, p, disc):
+    """
+    Calculates the price of an option discounting backwards through the tree, updating a single buffer in place
+
+    The buffers are allocated inside the kernel, which lets the compiler assume they do not alias.
+    Passing in reusable buffers measured slower than the allocation they save.
+
+    Large trees are swept in blocks of TILE_SIZE time steps. Each block walks tiles of the layer from
+    left to right, the tile shifting left by one node per step, so a node's later value is always
+    computed before it is read and each tile stays in cache across the steps of the block.
+
+    :param is_call: Whether the option is a call (otherwise a put)
+    :param is_american: Whether early exercise is allowed (otherwise European)
+    """
+    ST = np.empty(N + 1)
+    payoffs = np.empty(N + 1)
+
+    # Terminal stock prices, one multiply by u / d per node instead of two powers
+    ratio = u / d
+    ST[0] = S * d**N
+
+    for i in range(N + 1):
+        if i > 0:
+            ST[i] = ST[i - 1] * ratio
+        payoffs[i] = max(ST[i] - K, 0.0) if is_call else max(K - ST[i], 0.0)
+
+    one_minus_p = 1 - p
+    inv_d = 1 / d
+
+    if N < TILED_MIN_STEPS:
+        for step in range(N - 1, -1, -1):
+            _rollback_nodes(is_call, is_american, K, p, one_minus_p, disc, inv_d, ST, payoffs, 0, step + 1)
+        return payoffs[0]
+
+    n_nodes = N + 1
+    while n_nodes > 1:
+        n_steps = min(TILE_SIZE, n_nodes - 1)
+
+        for start in range(0, n_nodes, TILE_SIZE):
+            for k in range(1, n_steps + 1):
+                lo = max(start - k, 0)
+                hi = min(start + TILE_SIZE - k, n_nodes - k)
+
+                if lo < hi:
+                    _rollback_nodes(is_call, is_american, K, p, one_minus_p, disc, inv_d, ST, payoffs, lo, hi)
+
+        n_nodes -= n_steps
+
+    return payoffs[0]
+
+@njit("f8[::1](b1[::1], b1, f8[::1], f8[::1], i8, f8[::1], f8[::1], f8[::1], f8[::1])", cache=True, parallel=True)
+def _price_book_jit(is_call, is_american, S, K, N, u, d, p, disc):
+    """Rolls back the tree of every option in a book, spreading the options over threads"""
+    prices = np.empty(len(S))
+
+    for i in prange(len(S)):
+        prices[i] = _backward_induction_jit(is_call[i], is_american, S[i], K[i], N, u[i], d[i], p[i], disc[i])
+
+    return prices
+
+def _backward_induction(option_type, option_style, S, K, N, u, d, p, disc, buffers=None):
+    """
+    Calculates the price of an option discounting backwards through the tree
+
+    Runs the compiled kernel when Numba is installed, otherwise the NumPy rollback.
+
+    :param u: The up move of the stock price
+    :param d: The down move of the stock price
+    :param p: The risk-neutral probability
+    :param disc: The discount factor over one time step
+    :param buffers: Optional reusable scratch array of shape (3, N + 1) for the NumPy rollback
+    """
+    if NUMBA_AVAILABLE:
+        return _backward_induction_jit(
+            option_type == "call", option_style == "american", float(S), float(K), int(N),
+            float(u), float(d), float(p), float(disc)
+        )
+
+    if buffers is None:
+        buffers = np.empty((3, N + 1))
+    return _backward_induction_vec(option_type, option_style, S, K, N, u, d, p, disc, buffers)
+
+def price_binomial(option_type, option_style, S, K, T, sigma, r, q, N, model="crr", buffers=None):
+    """
+    Prices an option on a binomial tree straight from its parameters, without building an Option or Binomial
+
+    Inputs are not validated, this is meant for hot loops over already validated options.
+
+    :param option_type: Call or put
+    :param option_style: american or european (lower case)
+    :param model: The binomial model (crr, jr or lr)
+    :param buffers: Optional reusable scratch array of shape (3, N + 1) for the NumPy rollback
+    """
+    if model == "lr":
+        params = _tree_params(model, sigma, T, r, q, N, S, K)
+    else:
+        params = _tree_params(model, sigma, T, r, q, N)
+
+    return _backward_induction(option_type, option_style, S, K, N, *params, buffers)
+
+def price_many(options, option_style: str = "european", N: int = 1_000, model: str = "crr"):
+    """
+    Prices a whole book of options on binomial trees
+
+    :param options: Dict of arrays, structured array or DataFrame with option_type, S, K, T, sigma, r and optionally q
+    :param option_style: American or European, shared by the whole book
+    :param N: The number of time steps
+    :param model: The binomial model (crr, jr or lr)
+    :return: Array of prices
+    """
+    option_style, model = option_style.lower(), model.lower()
+    if option_style not in Binomial.VALID_OPTION_STYLES:
+        raise ValueError(f"Invalid option style '{option_style}'. Must be {Binomial.VALID_OPTION_STYLES}")
+    if model not in Binomial.VALID_MODELS:
+        raise ValueError(f"Invalid model '{model}'. Must be {Binomial.VALID_MODELS}")
+    if N <= 0:
+        raise ValueError("Number of steps must be greater than 0")
+
+    book = option_book(options)
+    params = np.array([
+        _tree_params(model, sigma, T, r, q, N, *((S, K) if model == "lr" else ()))
+        for S, K, T, sigma, r, q in zip(*(book[name].tolist() for name in ('S', 'K', 'T', 'sigma', 'r', 'q')))
+    ]).reshape(-1, 4)
+    u, d, p, disc = (np.ascontiguousarray(params[:, i]) for i in range(4))
+
+    if NUMBA_AVAILABLE:
+        return _price_book_jit(book['is_call'], option_style == "american", book['S'], book['K'], int(N), u, d, p, disc)
+
+    prices = np.empty(len(u))
+    buffers = np.empty((3, N + 1))     # shared by every tree of the book
+
+    for i in range(len(u)):
+        option_type = "call" if book['is_call'][i] else "put"
+        prices[i] = _backward_induction_vec(
+            option_type, option_style, book['S'][i], book['K'][i], N, u[i], d[i], p[i], disc[i], buffers
+        )
+
+    return prices
 
 class Binomial:
     VALID_MODELS = ['crr', 'jr', 'lr']
@@ -19,6 +288,7 @@ class Binomial:
         self.N = N
 
         self.dt = self.option.T / self.N
+        self._scratch = {}
 
         self._validate_inputs()
 
@@ -29,80 +299,105 @@ class Binomial:
         if self.N <= 0:
             raise ValueError(f"Number of steps must be greater than 0")
 
-    def _calculate_option_price(self, u, d, p):
-        """
-        Calculates the price of an option discounting backwards
-        
-        :param u: The up move of the stock price
-        :param d: The down move of the stock price
-        :param p: The risk-neutral probability
-        """
-        ST = self.option.S * u**(np.arange(0, self.N + 1, 1)) * d**(np.arange(self.N, -1, -1))
+    def _get(self, shape, dtype=np.float64):
+        """Returns a persistent scratch buffer of the given shape, allocating it on first use"""
+        key = (shape, np.dtype(dtype))
 
-        if self.option.option_type == "call":
-            payoffs = np.maximum(ST - self.option.K, 0)
-        else:   # self.option.option_type == "put"
-            payoffs = np.maximum(self.option.K - ST, 0)
+        if key not in self._scratch:
+            self._scratch[key] = np.empty(shape, dtype)
 
-        for _ in range(self.N - 1, -1, -1):
-            continuation = np.exp(-self.option.r * self.dt) * (p * payoffs[1:] + (1 - p) * payoffs[:-1])
+        return self._scratch[key]
 
-            if self.option_style == "american":
-                ST = ST[:-1] / d    # Stock prices at time previous step
+    def _tree_params(self, model, S=None, T=None, sigma=None, r=None):
+        """Looks up the cached parameters of a tree, defaulting to the option's own S, T, sigma and r"""
+        S = self.option.S if S is None else S
+        T = self.option.T if T is None else T
+        sigma = self.option.sigma if sigma is None else sigma
+        r = self.option.r if r is None else r
 
-                if self.option.option_type == "call":
-                    payoffs = np.maximum(ST - self.option.K, continuation)
-                else:   # self.option.option_type == "put"
-                    payoffs = np.maximum(self.option.K - ST, continuation)
-            else:   # self.option_style == "european":
-                payoffs = continuation
+        if model == "lr":
+            return _tree_params(model, sigma, T, r, self.option.q, self.N, S, self.option.K)
+        return _tree_params(model, sigma, T, r, self.option.q, self.N)
 
-        return payoffs[0]
+    def price_vec(self, model: str):
+        """
+        Prices the option on a single tree, with the compiled rollback when Numba is installed, otherwise
+        with the vectorised NumPy rollback (one operation over all nodes per time step)
+
+        :param model: The binomial model (crr, jr or lr)
+        """
+        model = model.lower()
+        if model not in self.VALID_MODELS:
+            raise ValueError(f"Invalid model '{model}'. Must be {self.VALID_MODELS}")
+
+        # The compiled kernel allocates its own arrays, only the NumPy rollback takes the scratch buffer
+        buffers = None if NUMBA_AVAILABLE else self._get((3, self.N + 1))
+
+        return price_binomial(
+            self.option.option_type, self.option_style, self.option.S, self.option.K, self.option.T,
+            self.option.sigma, self.option.r, self.option.q, self.N, model, buffers
+        )
 
     def _crr_model(self):
         """Calculates the price of an option under the Cox-Ross-Rubinstein model"""
-        u = np.exp(self.option.sigma * np.sqrt(self.dt))
-        d = 1 / u
-        p = (np.exp((self.option.r - self.option.q) * self.dt) - d) / (u - d)
-
-        return self._calculate_option_price(u, d, p)
+        return self.price_vec("crr")
 
     def _jr_model(self):
         """Calculates the price of an option under the Jarrow-Rudd model"""
-        p = 0.5
-        u = np.exp((self.option.r - self.option.q - 0.5 * self.option.sigma**2) * self.dt + self.option.sigma * np.sqrt(self.dt))
-        d = np.exp((self.option.r - self.option.q - 0.5 * self.option.sigma**2) * self.dt - self.option.sigma * np.sqrt(self.dt))
-
-        return self._calculate_option_price(u, d, p)
-
-    def _peizer_pratt_inversion(self, z):
-        """Evaluates the Peizer-Pratt function for a given parameter z"""
-        return 0.5 + 0.5 * np.sign(z) * np.sqrt(1 - np.exp(-((z / (self.N + 1/3 + 0.1/(self.N + 1)))**2 * (self.N + 1/6))))
+        return self.price_vec("jr")
 
     def _lr_model(self):
         """Calculates the price of an option under the Leisen-Reimer model"""
-        bs = BlackScholes(self.option)
+        return self.price_vec("lr")
 
-        d1 = bs._d1()
-        d2 = bs._d2()
+    def price_batch(self, model: str, S, T, sigma, r, backend: str = "numpy"):
+        """
+        Prices a batch of trees that differ only in S, T, sigma and r, rolling them back together
 
-        p = self._peizer_pratt_inversion(d2)
-        p_prime = self._peizer_pratt_inversion(d1)
+        :param model: The binomial model (crr, jr or lr)
+        :param S: Stock price of each tree
+        :param T: Time to maturity of each tree
+        :param sigma: Volatility of each tree
+        :param r: Risk-free rate of each tree
+        :param backend: Array library for the rollback, numpy or cupy (GPU)
+        """
+        model = model.lower()
+        if model not in self.VALID_MODELS:
+            raise ValueError(f"Invalid model '{model}'. Must be {self.VALID_MODELS}")
+        xp = _array_module(backend)
 
-        u = np.exp((self.option.r - self.option.q) * self.dt) * p_prime / p
-        d = np.exp((self.option.r - self.option.q) * self.dt) * (1 - p_prime) / (1 - p)
+        S, T, sigma, r = np.broadcast_arrays(*(np.atleast_1d(np.asarray(x, dtype=float)) for x in (S, T, sigma, r)))
+        params = xp.asarray([self._tree_params(model, *map(float, tree)) for tree in zip(S, T, sigma, r)])
+        u, d, p, disc = (params[:, [i]] for i in range(4))
+        ST = xp.empty((len(S), self.N + 1))
+        ST[:, :1] = xp.asarray(S)[:, None] * d**self.N
+        ST[:, 1:] = u / d
+        xp.cumprod(ST, axis=1, out=ST)     # terminal stock prices as a running product of u / d
 
-        return self._calculate_option_price(u, d, p)
+        if self.option.option_type == "call":
+            payoffs = xp.maximum(ST - self.option.K, 0)
+        else:   # self.option.option_type == "put"
+            payoffs = xp.maximum(self.option.K - ST, 0)
+
+        one_minus_p = 1 - p
+        inv_d = 1 / d
+
+        for _ in range(self.N - 1, -1, -1):
+            payoffs = disc * (p * payoffs[:, 1:] + one_minus_p * payoffs[:, :-1])
+
+            if self.option_style == "american":
+                ST = ST[:, :-1] * inv_d     # Stock prices at time previous step
+
+                if self.option.option_type == "call":
+                    payoffs = xp.maximum(ST - self.option.K, payoffs)
+                else:   # self.option.option_type == "put"
+                    payoffs = xp.maximum(self.option.K - ST, payoffs)
+
+        if xp is np:
+            return payoffs[:, 0]
+        return xp.asnumpy(payoffs[:, 0])     # copy the root prices back from the GPU
 
     def price(self, model: str):
         """Calculates the price of an option under a specified model"""
         self.model = model.lower()
-
-        if self.model == "crr":
-            return self._crr_model()
-        elif self.model == "jr":
-            return self._jr_model()
-        elif self.model == "lr":
-            return self._lr_model()
-        else:
-            raise ValueError(f"Invalid option style '{self.model}'. Must be {self.VALID_MODELS}")
+        return self.price_vec(self.model)
@@ -1,7 +1,182 @@
+import math
+import warnings
 import numpy as np
+from dataclasses import replace
+from functools import lru_cache
 from ..option_class import Option
-from scipy.stats import norm
-from scipy.optimize import brentq
+from scipy.special import ndtr
+
+_SQRT_HALF = 0.7071067811865475
+_INV_SQRT_2PI = 0.3989422804014327
+
+def _norm_cdf(x):
+    """Standard normal cumulative distribution function for scalars"""
+    return 0.5 * math.erfc(-x * _SQRT_HALF)
+
+def _norm_pdf(x):
+    """Standard normal probability density function for scalars"""
+    return _INV_SQRT_2PI * math.exp(-0.5 * x * x)
+
+def _norm_pdf_vec(x):
+    """Standard normal probability density function for arrays"""
+    return _INV_SQRT_2PI * np.exp(-0.5 * x * x)
+
+def _d1_d2(S, K, T, sigma, r, q):
+    """Calculate d1 and d2 for array inputs"""
+    sigma_sqrtT = sigma * np.sqrt(T)
+    d1 = (np.log(S / K) + (r - q + 0.5 * sigma * sigma) * T) / sigma_sqrtT
+    return d1, d1 - sigma_sqrtT
+
+def bs_price_vec(option_type, S, K, T, sigma, r, q=0):
+    """
+    Calculate Black-Scholes prices of European options, broadcasting over NumPy arrays
+
+    :param option_type: 'call' or 'put', or an array of them
+    :param S: Current stock price
+    :param K: Strike price
+    :param T: Time to maturity in years
+    :param sigma: Volatility
+    :param r: Risk-free rate
+    :param q: Dividend yield rate
+    """
+    is_call = np.asarray(option_type) == "call"
+    S, K, T, sigma, r, q = (np.asarray(x, dtype=float) for x in (S, K, T, sigma, r, q))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d1, d2 = _d1_d2(S, K, T, sigma, r, q)
+        disc_q = S * np.exp(-q * T)
+        disc_r = K * np.exp(-r * T)
+
+        call_price = disc_q * ndtr(d1) - disc_r * ndtr(d2)
+        put_price = disc_r * ndtr(-d2) - disc_q * ndtr(-d1)
+        intrinsic = np.where(is_call, np.maximum(S - K, 0), np.maximum(K - S, 0))
+
+        return np.where(T > 0, np.where(is_call, call_price, put_price), intrinsic)
+
+def bs_greeks_vec(option_type, S, K, T, sigma, r, q=0):
+    """
+    Calculate the Black-Scholes price and greeks of European options, broadcasting over NumPy arrays
+
+    d1, d2 and the normal terms are computed once and shared by every output. The greeks are
+    returned unscaled, i.e. vega and rho per unit change and theta per year.
+
+    :param option_type: 'call' or 'put', or an array of them
+    :param S: Current stock price
+    :param K: Strike price
+    :param T: Time to maturity in years
+    :param sigma: Volatility
+    :param r: Risk-free rate
+    :param q: Dividend yield rate
+    """
+    is_call = np.asarray(option_type) == "call"
+    S, K, T, sigma, r, q = (np.asarray(x, dtype=float) for x in (S, K, T, sigma, r, q))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sqrtT = np.sqrt(T)
+        d1, d2 = _d1_d2(S, K, T, sigma, r, q)
+
+        disc_q = S * np.exp(-q * T)
+        disc_r = K * np.exp(-r * T)
+        Nd1, Nd2 = ndtr(d1), ndtr(d2)
+        Nmd1, Nmd2 = ndtr(-d1), ndtr(-d2)
+        nd1 = _norm_pdf_vec(d1)
+
+        call_price = disc_q * Nd1 - disc_r * Nd2
+        put_price = disc_r * Nmd2 - disc_q * Nmd1
+        intrinsic = np.where(is_call, np.maximum(S - K, 0), np.maximum(K - S, 0))
+        price = np.where(T > 0, np.where(is_call, call_price, put_price), intrinsic)
+
+        decay = -disc_q * nd1 * sigma / (2 * sqrtT)
+
+        return {
+            'Price': price,
+            'Delta': np.exp(-q * T) * np.where(is_call, Nd1, Nd1 - 1),
+            'Gamma': np.exp(-q * T) * nd1 / (S * sigma * sqrtT),
+            'Vega': disc_q * nd1 * sqrtT,
+            'Theta': np.where(
+                is_call,
+                decay - r * disc_r * Nd2 + q * disc_q * Nd1,
+                decay + r * disc_r * Nmd2 - q * disc_q * Nmd1
+            ),
+            'Rho': np.where(is_call, disc_r * T * Nd2, -disc_r * T * Nmd2)
+        }
+
+def price_chain(calls, puts, S, T, r, q=0):
+    """
+    Price a whole option chain with Black-Scholes, using the implied volatility quoted at each strike
+
+    :param calls: Call options with 'strike' and 'impliedVolatility' columns
+    :param puts: Put options with 'strike' and 'impliedVolatility' columns
+    :param S: Current stock price
+    :param T: Time to maturity in years
+    :param r: Risk-free rate
+    :param q: Dividend yield rate
+    :return: Copies of calls and puts with added 'bsPrice' and 'delta' columns
+    """
+    priced = []
+
+    for option_type, options in (("call", calls), ("put", puts)):
+        greeks = bs_greeks_vec(option_type, S, options['strike'].to_numpy(), T, options['impliedVolatility'].to_numpy(), r, q)
+        priced.append(options.assign(bsPrice=greeks['Price'], delta=greeks['Delta']))
+
+    return tuple(priced)
+
+def _bs_terms(S, K, T, sigma, r, q):
+    """Calculate the terms shared by the price and greeks: sqrt(T), the discount factors, d1, d2 and N'(d1)"""
+    sqrtT = math.sqrt(T)
+    disc_r = math.exp(-r * T)
+    disc_q = math.exp(-q * T)
+
+    if sqrtT > 0:
+        d1 = (math.log(S / K) + (r - q + 0.5 * sigma * sigma) * T) / (sigma * sqrtT)
+        d2 = d1 - sigma * sqrtT
+    else:   # d1 and d2 diverge at expiry
+        d1 = d2 = math.copysign(math.inf, S - K)
+
+    return sqrtT, disc_r, disc_q, d1, d2, _norm_pdf(d1)
+
+@lru_cache(maxsize=4096)
+def _cached_bs_price(option_type, S, K, T, sigma, r, q):
+    """Calculate the price of a European option, cached on the option parameters"""
+    if T == 0:
+        return max(S - K, 0) if option_type == "call" else max(K - S, 0)
+
+    _, disc_r, disc_q, d1, d2, _ = _bs_terms(S, K, T, sigma, r, q)
+
+    if option_type == "call":
+        return S * disc_q * _norm_cdf(d1) - K * disc_r * _norm_cdf(d2)
+    else:   # option_type == "put"
+        return K * disc_r * _norm_cdf(-d2) - S * disc_q * _norm_cdf(-d1)
+
+@lru_cache(maxsize=4096)
+def _cached_bs_greeks(option_type, S, K, T, sigma, r, q):
+    """
+    Calculate the unscaled greeks of a European option, cached on the option parameters
+
+    The returned dict is shared between cache hits, so callers must not modify it.
+    """
+    sqrtT, disc_r, disc_q, d1, d2, nd1 = _bs_terms(S, K, T, sigma, r, q)
+    gamma = disc_q * nd1 / (S * sigma * sqrtT) if sqrtT > 0 else 0.0
+    decay = -(S * disc_q * nd1 * sigma) / (2 * sqrtT) if sqrtT > 0 else 0.0
+
+    if option_type == "call":
+        delta = disc_q * _norm_cdf(d1)
+        theta = decay - r * K * disc_r * _norm_cdf(d2) + q * S * disc_q * _norm_cdf(d1)
+        rho = K * T * disc_r * _norm_cdf(d2)
+    else:   # option_type == "put"
+        delta = disc_q * (_norm_cdf(d1) - 1)
+        theta = decay + r * K * disc_r * _norm_cdf(-d2) - q * S * disc_q * _norm_cdf(-d1)
+        rho = -K * T * disc_r * _norm_cdf(-d2)
+
+    return {
+        'Delta': delta,
+        'Gamma': gamma,
+        'Vega': S * disc_q * nd1 * sqrtT,
+        'Theta': theta,
+        'Rho': rho,
+        'd1': d1,
+        'd2': d2
+    }
 
 class BlackScholes:
     VALID_OPTION_TYPES = {'call', 'put'}
@@ -14,114 +189,113 @@ class BlackScholes:
         """
         self.option = option
 
+    @property
+    def sigma(self):
+        return self.option.sigma
+
+    @sigma.setter
+    def sigma(self, sigma):
+        """Swap in an option with the new volatility"""
+        self.option = replace(self.option, sigma=sigma)
+
+    def _params(self):
+        """The option parameters in the order taken by the cached pricing functions"""
+        return (self.option.option_type, self.option.S, self.option.K, self.option.T,
+                self.option.sigma, self.option.r, self.option.q)
+
+    def _greeks(self):
+        """Get the cached greeks for the current option state"""
+        return _cached_bs_greeks(*self._params())
+
     def _d1(self):
         """Calculate d1"""
-        return (np.log(self.option.S / self.option.K) + (self.option.r - self.option.q + 0.5 * self.option.sigma**2) * self.option.T) / \
-               (self.option.sigma * np.sqrt(self.option.T))
+        return self._greeks()['d1']
 
     def _d2(self):
         """Calculate d2"""
-        return self._d1() - self.option.sigma * np.sqrt(self.option.T)
+        return self._greeks()['d2']
 
     def price(self):
         """Calculate the price of a European option"""
-        if self.option.option_type == "call":
-            if self.option.T == 0:
-                return max(self.option.S - self.option.K, 0)
-            return self.option.S * np.exp(-self.option.q * self.option.T) * norm.cdf(self._d1()) - \
-                   self.option.K * np.exp(-self.option.r * self.option.T) * norm.cdf(self._d2())
-        else:   # self.option.option_type == "put"
-            if self.option.T == 0:
-                return max(self.option.K - self.option.S, 0)
-            return self.option.K * np.exp(-self.option.r * self.option.T) * norm.cdf(-self._d2()) - \
-                   self.option.S * np.exp(-self.option.q * self.option.T) * norm.cdf(-self._d1())
+        return _cached_bs_price(*self._params())
 
     def delta(self):
         """Calculate the Delta of the option"""
-        if self.option.option_type == "call":
-            return np.exp(-self.option.q * self.option.T) * norm.cdf(self._d1())
-        else:   # self.option.option_type == "put"
-            return np.exp(-self.option.q * self.option.T) * (norm.cdf(self._d1()) - 1)
+        return self._greeks()['Delta']
 
     def gamma(self):
         """Calculate the Gamma of the option"""
-        return np.exp(-self.option.q * self.option.T) * norm.pdf(self._d1()) / (self.option.S * self.option.sigma * np.sqrt(self.option.T))
+        return self._greeks()['Gamma']
 
     def vega(self):
         """Calculate the Vega of the option"""
-        return self.option.S * np.exp(-self.option.q * self.option.T) * norm.pdf(self._d1()) * np.sqrt(self.option.T)
+        return self._greeks()['Vega']
 
     def theta(self):
         """Calculate the Theta of the option"""
-        if self.option.option_type == "call":
-            return -(self.option.S * np.exp(-self.option.q * self.option.T) * norm.pdf(self._d1()) * self.option.sigma) / (2 * np.sqrt(self.option.T)) - \
-                     self.option.r * self.option.K * np.exp(-self.option.r * self.option.T) * norm.cdf(self._d2()) + \
-                     self.option.q * self.option.S * np.exp(-self.option.q * self.option.T) * norm.cdf(self._d1())
-        else:   # self.option.option_type == "put"
-            return -(self.option.S * np.exp(-self.option.q * self.option.T) * norm.pdf(self._d1()) * self.option.sigma) / (2 * np.sqrt(self.option.T)) + \
-                     self.option.r * self.option.K * np.exp(-self.option.r * self.option.T) * norm.cdf(-self._d2()) - \
-                     self.option.q * self.option.S * np.exp(-self.option.q * self.option.T) * norm.cdf(-self._d1())
+        return self._greeks()['Theta']
 
     def rho(self):
         """Calculate the Rho of the option"""
-        if self.option.option_type == "call":
-            return self.option.K * self.option.T * np.exp(-self.option.r * self.option.T) * norm.cdf(self._d2())
-        else:   # self.option.option_type == "put"
-            return -self.option.K * self.option.T * np.exp(-self.option.r * self.option.T) * norm.cdf(-self._d2())
+        return self._greeks()['Rho']
 
     def greeks(self):
         """Get a table of all the greeks"""
+        greeks = self._greeks()
         return {
-            'Delta': self.delta(),
-            'Gamma': self.gamma(),
-            'Vega': self.vega() / 100,
-            'Theta': self.theta() / 365,
-            'Rho': self.rho() / 100
+            'Delta': greeks['Delta'],
+            'Gamma': greeks['Gamma'],
+            'Vega': greeks['Vega'] / 100,
+            'Theta': greeks['Theta'] / 365,
+            'Rho': greeks['Rho'] / 100
         }
 
-    def iv_newton_raphson(self, market_price, tolerance, max_iterations, sigma):
-        option = Option(self.option.option_type, self.option.S, self.option.K, self.option.T, sigma, self.option.r, self.option.q)
-        for _ in range(max_iterations):
-            option = BlackScholes(self.option.option_type, self.option.S, self.option.K, self.option.T, self.option.r, sigma_imp, self.option.q)
-            bs_price = option.price()
-
-            res = bs_price - market_price
-            if abs(res) < tolerance:
-                return sigma_imp
-
-            vega = option.vega()
-            if vega < 1e-8:
-                break
-
-            sigma_imp -= res / vega
-        raise RuntimeError("Implied volatility did not converge")
-
     def implied_volatility_brent(self, market_price: float, max_iterations: int = 100, tolerance: float = 1e-6):
         """
-        Calculate the implied volatility of the option using Brent's method
+        Calculate the implied volatility of the option using Brent's method, updating sigma to the solution
 
         :param market_price: current price of the option
         :param max_iterations: number of iterations to itrerate through the optimisation function
         :param tolerance: Tolerance for the implied volatility
-        :param T: Time to maturity in years
-        :param r: Risk-free rate
-        :param sigma: Volatility
-        :param q: Dividend yield rate
         """
-        sigma = 0.2
-        bs_option = BlackScholes(self.option.option_type, self.option.S, self.option.K, self.option.T, self.option.r, sigma, self.option.q)
+        from ..analysis.iv_solver import ImpliedVolatilitySolver
 
-        def objective(sigma):
-            price = bs_option.price()
-            return price - market_price
+        solver = ImpliedVolatilitySolver(
+            market_price,
+            self.option.option_type,
+            self.option.S,
+            self.option.K,
+            self.option.T,
+            self.option.r,
+            self.option.q,
+            max_iterations=max_iterations,
+            tolerance=tolerance
+        )
+        implied_vol = solver.iv_brent()
 
-        implied_vol = brentq(objective, 1e-6, 5, maxiter=max_iterations, xtol=tolerance)
         if implied_vol:
-            self.option.sigma = implied_vol
+            self.sigma = implied_vol
             return implied_vol
         else:
             print("Could not find a valid implied volatility")
             return None
 
     def partial_differential_equation(self):
-        return self.theta() + 0.5 * self.option.sigma**2 * self.option.S**2 * self.gamma() + self.option.r * self.option.S * self.delta() - self.option.r * self.price()
\ No newline at end of file
+        return self.theta() + 0.5 * self.option.sigma**2 * self.option.S**2 * self.gamma() + self.option.r * self.option.S * self.delta() - self.option.r * self.price()
+
+def _scalar_matches_vectorised():
+    """Checks the scalar math-module path against the vectorised scipy path on short-dated at-the-money options"""
+    for option_type in ('call', 'put'):
+        option = Option(option_type, 100.0, 100.0, 7 / 365, 0.2, 0.05, 0.01)
+        scalar = BlackScholes(option)
+        vectorised = bs_greeks_vec(option_type, option.S, option.K, option.T, option.sigma, option.r, option.q)
+
+        for name, value in (('Price', scalar.price()), ('Delta', scalar.delta()), ('Gamma', scalar.gamma()),
+                            ('Vega', scalar.vega()), ('Theta', scalar.theta()), ('Rho', scalar.rho())):
+            if not math.isclose(value, vectorised[name], rel_tol=1e-9):
+                return False
+
+    return True
+
+if not _scalar_matches_vectorised():
+    warnings.warn("Scalar Black-Scholes results disagree with the vectorised scipy implementation")
@@ -1,56 +1,431 @@
+import os
+import math
+import queue
 import numpy as np
-from ..option_class import Option
+from concurrent.futures import ThreadPoolExecutor
+from scipy.stats import qmc
+from scipy.special import ndtri
+from .._jit import njit, prange, List, NUMBA_AVAILABLE
+from ..option_class import Option, option_book
+
+# Numba type of a typed list of NumPy generators, any bit generator (PCG64, SFC64) has the same type
+_GENERATORS = "ListType(NumPyRandomGeneratorType('NumPyRandomGeneratorType'))"
+
+@njit(cache=True, fastmath=True, nogil=True)
+def _terminal_moments(rng, S, K, r, q, sigma, T, n_samples, is_call, antithetic, control_mean):
+    """
+    Samples discounted European payoffs from terminal prices, drawing from a NumPy generator
+
+    The discounted terminal prices are kept alongside as the control variate, centred on their known mean so
+    that its variance does not cancel away when the antithetic pairs barely vary.
+
+    :param rng: NumPy random generator to draw the normals from
+    :param n_samples: Number of normal draws, each giving one path or one antithetic pair of paths
+    :param is_call: Whether the option is a call (otherwise a put)
+    :param antithetic: Whether each draw Z is paired with -Z, averaging the two payoffs into one sample
+    :param control_mean: The known expectation E[X] = S * exp(-qT) of the discounted terminal price X
+    :return: The sums of the discounted payoffs Y, their squares, X - E[X], its squares and (X - E[X])Y
+    """
+    drift = (r - q - 0.5 * sigma * sigma) * T
+    diffusion = sigma * math.sqrt(T)
+    disc = math.exp(-r * T)
+
+    payoff_sum = 0.0
+    payoff_sq_sum = 0.0
+    control_sum = 0.0
+    control_sq_sum = 0.0
+    cross_sum = 0.0
+
+    for _ in range(n_samples):
+        Z = rng.standard_normal()
+        ST = S * math.exp(drift + diffusion * Z)
+        discounted_payoff = disc * (max(ST - K, 0.0) if is_call else max(K - ST, 0.0))
+        control = disc * ST
+
+        if antithetic:
+            ST = S * math.exp(drift - diffusion * Z)
+            discounted_payoff = 0.5 * (discounted_payoff + disc * (max(ST - K, 0.0) if is_call else max(K - ST, 0.0)))
+            control = 0.5 * (control + disc * ST)
+
+        control -= control_mean
+        payoff_sum += discounted_payoff
+        payoff_sq_sum += discounted_payoff * discounted_payoff
+        control_sum += control
+        control_sq_sum += control * control
+        cross_sum += control * discounted_payoff
+
+    return payoff_sum, payoff_sq_sum, control_sum, control_sq_sum, cross_sum
+
+@njit("UniTuple(f8, 3)(i8, f8, f8, f8, f8, f8, b1)", cache=True, fastmath=True, nogil=True)
+def _estimate(n_samples, payoff_sum, payoff_sq_sum, control_sum, control_sq_sum, cross_sum, control_variate):
+    """
+    Estimates the price and its standard error from the raw moments of the discounted payoffs Y and the control X
+
+    The control moments are those of X - E[X]. With the control variate, the mean of Y is corrected by
+    beta * (mean of X - E[X]), beta being the regression coefficient of Y on X estimated from the same samples,
+    and the standard error is that of the residuals.
+
+    :param control_variate: Whether to apply the control variate
+    :return: The price, its standard error and beta (0 without the control variate)
+    """
+    price = payoff_sum / n_samples
+    variance = max(payoff_sq_sum / n_samples - price * price, 0.0)
+
+    if control_variate:
+        control = control_sum / n_samples
+        control_variance = control_sq_sum / n_samples - control * control
+
+        if control_variance > 0:
+            covariance = cross_sum / n_samples - control * price
+            beta = covariance / control_variance
+
+            return price - beta * control, math.sqrt(max(variance - beta * covariance, 0.0) / n_samples), beta
+
+    return price, math.sqrt(variance / n_samples), 0.0
+
+@njit(
+    "UniTuple(f8, 2)(f8, f8, f8, f8, f8, f8, i8, b1, b1, b1, " + _GENERATORS + ", i8)",
+    cache=True, fastmath=True, parallel=True
+)
+def _mc_european(S, K, r, q, sigma, T, n_samples, is_call, antithetic, control_variate, rngs, batch_size):
+    """
+    Prices a European option from terminal samples, spreading the batches of paths over threads
+
+    Each batch draws from its own generator, so the result does not depend on the number of threads.
+
+    :param n_samples: Number of normal draws, each giving one path or one antithetic pair of paths
+    :param control_variate: Whether to correct the price with the discounted terminal price as a control variate
+    :param rngs: Typed list of the NumPy generator of each batch
+    :return: The price and its standard error
+    """
+    payoff_sum = 0.0
+    payoff_sq_sum = 0.0
+    control_sum = 0.0
+    control_sq_sum = 0.0
+    cross_sum = 0.0
+    control_mean = S * math.exp(-q * T)
+
+    for b in prange(len(rngs)):
+        batch_samples = min((b + 1) * batch_size, n_samples) - b * batch_size
+        moments = _terminal_moments(
+            rngs[np.int64(b)], S, K, r, q, sigma, T, batch_samples, is_call, antithetic, control_mean
+        )
+
+        payoff_sum += moments[0]
+        payoff_sq_sum += moments[1]
+        control_sum += moments[2]
+        control_sq_sum += moments[3]
+        cross_sum += moments[4]
+
+    price, std_error, _ = _estimate(n_samples, payoff_sum, payoff_sq_sum, control_sum, control_sq_sum, cross_sum, control_variate)
+    return price, std_error
+
+@njit(
+    "UniTuple(f8[::1], 2)(f8[::1], f8[::1], f8[::1], f8[::1], f8[::1], f8[::1], b1[::1], i8, b1, b1, " + _GENERATORS + ")",
+    cache=True, fastmath=True, parallel=True
+)
+def _price_book_mc(S, K, r, q, sigma, T, is_call, n_samples, antithetic, control_variate, rngs):
+    """
+    Prices every option of a book from terminal samples, spreading the options over threads
+
+    :param rngs: Typed list of the NumPy generator of each option
+    :return: Arrays of the prices and their standard errors
+    """
+    prices = np.empty(len(S))
+    std_errors = np.empty(len(S))
+
+    for i in prange(len(S)):
+        moments = _terminal_moments(
+            rngs[np.int64(i)], S[i], K[i], r[i], q[i], sigma[i], T[i], n_samples, is_call[i], antithetic, S[i] * math.exp(-q[i] * T[i])
+        )
+
+        prices[i], std_errors[i], _ = _estimate(
+            n_samples, moments[0], moments[1], moments[2], moments[3], moments[4], control_variate
+        )
+
+    return prices, std_errors
+
+def price_many(options, n_paths: int = 100_000, seed: int = None, antithetic: bool = True, control_variate: bool = True):
+    """
+    Prices a whole book of European options with Monte Carlo simulation
+
+    :param options: Dict of arrays, structured array or DataFrame with option_type, S, K, T, sigma, r and optionally q
+    :param n_paths: The number of simulation paths for each option
+    :param seed: Seed for the random number generator, for reproducible prices
+    :param antithetic: Whether to pair each normal draw Z with -Z, halving the draws needed
+    :param control_variate: Whether to use the discounted terminal price as a control variate
+    :return: Arrays of the prices and their standard errors
+    """
+    if n_paths <= 0:
+        raise ValueError("Number of simulation paths must be greater than 0")
+
+    book = option_book(options)
+    seeds = np.random.SeedSequence(seed).generate_state(len(book['S'])).astype(np.int64)
+
+    if NUMBA_AVAILABLE:
+        n_samples = -(-n_paths // 2) if antithetic else n_paths
+        rngs = List([np.random.Generator(np.random.PCG64(s)) for s in seeds])
+        return _price_book_mc(
+            book['S'], book['K'], book['r'], book['q'], book['sigma'], book['T'], book['is_call'],
+            int(n_samples), bool(antithetic), bool(control_variate), rngs
+        )
+
+    results = np.empty((len(seeds), 2))
+    for i in range(len(seeds)):
+        option = Option(
+            "call" if book['is_call'][i] else "put",
+            book['S'][i], book['K'][i], book['T'][i], book['sigma'][i], book['r'][i], book['q'][i]
+        )
+        results[i] = MonteCarlo(
+            option, n_paths=n_paths, seed=int(seeds[i]), antithetic=antithetic, control_variate=control_variate
+        ).price()
+
+    return results[:, 0], results[:, 1]
 
 class MonteCarlo:
     VALID_OPTION_TYPES = {'call', 'put'}
+    VALID_RNG_METHODS = ['pcg64', 'sfc64', 'sobol']
+    BATCH_SIZE = 8_192
+    SOBOL_REPLICATES = 16
 
-    def __init__(self, option: Option, n_steps: int = 252, n_paths: int = 100_000):
+    def __init__(self, option: Option, n_steps: int = 252, n_paths: int = 100_000, seed: int = None, rng_method: str = "pcg64",
+                 antithetic: bool = None, control_variate: bool = None, max_workers: int = None):
         """
         Initialise paramters for Monte Carlo simulation
 
         :param option: The data of the option (option_type, S, K, T, sigma, r, q)
         :param n_steps: The number of time steps to simulate
         :param n_paths: The number of simulation paths
+        :param seed: Seed for the random number generator, for reproducible prices
+        :param rng_method: The bit generator, pcg64 (numpy's default) or sfc64 (faster, smaller state),
+                           or sobol for scrambled Sobol points (quasi-Monte Carlo)
+        :param antithetic: Whether to pair each normal draw Z with -Z when pricing, halving the draws needed.
+                           Defaults to on for the pseudo-random generators and off for sobol, whose balance it upsets
+        :param control_variate: Whether to correct the price with the discounted terminal price, whose expectation is known.
+                                Defaults to on for the pseudo-random generators and off for sobol
+        :param max_workers: Number of threads for the NumPy batches, defaults to the number of CPUs
         """
         self.option = option
         self.n_steps = n_steps
         self.n_paths = n_paths
+        self.rng_method = rng_method.lower()
+        self.antithetic = self.rng_method != "sobol" if antithetic is None else antithetic
+        self.control_variate = self.rng_method != "sobol" if control_variate is None else control_variate
+        self.max_workers = max_workers
 
         self._validate_inputs()
 
+        # Independent, reproducible streams for the parallel batches are spawned from this
+        self.seed_sequence = np.random.SeedSequence(seed)
+        self.rng = self._generator(self.seed_sequence, self.n_steps)
+
+        # Thread-safe pool of batch buffers, reused by the batches and by repeated price calls
+        self._scratch = queue.SimpleQueue()
+
     def _validate_inputs(self):
         if self.n_steps <= 0:
             raise ValueError(f"Number of steps must be greater than 0")
         if self.n_paths <= 0:
             raise ValueError(f"Number of simulation paths must be greater than 0")
+        if self.rng_method not in self.VALID_RNG_METHODS:
+            raise ValueError(f"Invalid rng method '{self.rng_method}'. Must be {self.VALID_RNG_METHODS}")
+
+    def _generator(self, seed_sequence, d=1):
+        """
+        Creates a random number generator on the chosen bit generator
+
+        :param d: Dimension of each Sobol point (the normals per path), ignored by the pseudo-random generators
+        """
+        if self.rng_method == "sfc64":
+            return np.random.Generator(np.random.SFC64(seed_sequence))
+        elif self.rng_method == "sobol":
+            return qmc.Sobol(d, scramble=True, rng=np.random.Generator(np.random.PCG64(seed_sequence)))
+        else:   # self.rng_method == "pcg64"
+            return np.random.Generator(np.random.PCG64(seed_sequence))
+
+    def _standard_normal(self, rng, out):
+        """
+        Fills a float32 array of shape (n_paths,) or (n_paths, d) with standard normals
+
+        Sobol points are mapped through the inverse normal CDF, one point per path.
+        """
+        if self.rng_method == "sobol":
+            out[...] = ndtri(rng.random(len(out))).reshape(out.shape)
+        else:
+            rng.standard_normal(dtype=np.float32, out=out)
+
+    def _simulate_paths(self, n_paths=None, rng=None):
+        """
+        Simulates geometric brownian motion paths for the stock price
+
+        :param n_paths: Number of paths to simulate, defaults to all of them (smaller batches can be streamed)
+        :param rng: Random number generator to draw from, defaults to the instance's generator
+        """
+        n_paths = self.n_paths if n_paths is None else n_paths
+        rng = self.rng if rng is None else rng
 
-    def _simulate_paths(self):
-        """Simulates geometric brownian motion paths for the stock price"""
+        # Single precision halves the memory traffic, its rounding is far below the Monte Carlo error
         dt = self.option.T / self.n_steps
-        Z = np.random.standard_normal((self.n_paths, self.n_steps))
+        Z = np.empty((n_paths, self.n_steps), dtype=np.float32)
+        self._standard_normal(rng, Z)
 
-        drift = (self.option.r - self.option.q - 0.5 * self.option.sigma**2) * dt
-        diffusion = self.option.sigma * np.sqrt(dt)
+        drift = np.float32((self.option.r - self.option.q - 0.5 * self.option.sigma**2) * dt)
+        diffusion = np.float32(self.option.sigma * math.sqrt(dt))
 
         returns = drift + diffusion * Z
-        log_prices = np.log(self.option.S) + np.cumsum(returns, axis=1)
+        log_prices = np.float32(math.log(self.option.S)) + np.cumsum(returns, axis=1)
         paths = np.exp(log_prices)
         
         return paths
 
-    def price(self):
-        """Calculates the price of a European-style option"""
-        paths = self._simulate_paths()
-        ST = paths[:, -1]
+    def _get(self):
+        """Takes a float32 buffer for one batch (and its antithetic half) from the pool, allocating it if the pool is empty"""
+        try:
+            return self._scratch.get_nowait()
+        except queue.Empty:
+            return np.empty(2 * self.BATCH_SIZE, dtype=np.float32)
+
+    def _simulate_terminal(self, n_paths, rng, antithetic=False, out=None):
+        """
+        Samples the stock price at maturity directly from its log-normal distribution
+
+        :param n_paths: Number of normals to draw
+        :param rng: Random number generator to draw from
+        :param antithetic: Whether to also return the mirrored prices from -Z, after the prices from Z
+        :param out: Optional float32 buffer to sample into, of at least n_paths (2 * n_paths if antithetic) elements
+        """
+        n_prices = 2 * n_paths if antithetic else n_paths
+        ST = np.empty(n_prices, dtype=np.float32) if out is None else out[:n_prices]
+
+        self._standard_normal(rng, ST[:n_paths])
+        if antithetic:
+            np.negative(ST[:n_paths], out=ST[n_paths:])
+
+        drift = np.float32((self.option.r - self.option.q - 0.5 * self.option.sigma**2) * self.option.T)
+        diffusion = np.float32(self.option.sigma * math.sqrt(self.option.T))
+
+        # Built in place in the float32 buffer
+        ST *= diffusion
+        ST += drift
+        np.exp(ST, out=ST)
+        ST *= np.float32(self.option.S)
+
+        return ST
+
+    def _batch_moments(self, n_samples, seed_sequence):
+        """
+        Calculates the raw moments of the discounted payoffs of one batch, drawn from its own stream
+
+        :param n_samples: Number of samples in the batch
+        :param seed_sequence: Seed of the batch's stream
+        :return: The sums of the discounted payoffs Y, their squares, X - E[X] for the discounted terminal prices X,
+            its squares and (X - E[X])Y
+        """
+        disc = np.float32(math.exp(-self.option.r * self.option.T))
+        K = np.float32(self.option.K)
+
+        # The payoff only depends on the terminal price, so the intermediate steps are not simulated
+        buffer, payoff_buffer = self._get(), self._get()
+        ST = self._simulate_terminal(n_samples, self._generator(seed_sequence), self.antithetic, buffer)
+        discounted_payoffs = payoff_buffer[:len(ST)]
 
         if self.option.option_type == "call":
-            payoffs = np.maximum(ST - self.option.K, 0)
+            np.subtract(ST, K, out=discounted_payoffs)
         else:    # self.option.option_type == "put"
-            payoffs = np.maximum(self.option.K - ST, 0)
+            np.subtract(K, ST, out=discounted_payoffs)
+
+        np.maximum(discounted_payoffs, 0, out=discounted_payoffs)
+        discounted_payoffs *= disc
+
+        # The discounted terminal prices overwrite the terminal prices as the control variate, centred on their
+        # known mean since the raw float32 moments would cancel away the small variance of the antithetic pairs
+        controls = ST
+        controls *= disc
+        controls -= np.float32(self._control_mean())
+
+        if self.antithetic:     # each antithetic pair is one sample, averaged into the first half
+            for values in (discounted_payoffs, controls):
+                values[:n_samples] += values[n_samples:]
+                values[:n_samples] *= 0.5
+
+            discounted_payoffs, controls = discounted_payoffs[:n_samples], controls[:n_samples]
 
-        discounted_payoffs = np.exp(-self.option.r * self.option.T) * payoffs
+        moments = (
+            discounted_payoffs.sum(dtype=np.float64),
+            np.einsum('i,i->', discounted_payoffs, discounted_payoffs, dtype=np.float64),
+            controls.sum(dtype=np.float64),
+            np.einsum('i,i->', controls, controls, dtype=np.float64),
+            np.einsum('i,i->', controls, discounted_payoffs, dtype=np.float64)
+        )
+        self._scratch.put(buffer)
+        self._scratch.put(payoff_buffer)
 
-        price = np.mean(discounted_payoffs)
-        std_error = np.std(discounted_payoffs) / np.sqrt(self.n_paths)
+        return moments
+
+    def _batches(self):
+        """
+        Splits the samples into batches
+
+        Sobol batches are independent scrambles of equal, power of two sizes (keeping the balance of the points),
+        at most BATCH_SIZE and small enough for SOBOL_REPLICATES of them, so the samples are rounded up.
+        """
+        n_samples = self._n_samples()
+
+        if self.rng_method == "sobol":
+            batch_size = min(self.BATCH_SIZE, 1 << (max(n_samples // self.SOBOL_REPLICATES, 1).bit_length() - 1))
+            return [batch_size] * -(-n_samples // batch_size)
+
+        return [min(self.BATCH_SIZE, n_samples - start) for start in range(0, n_samples, self.BATCH_SIZE)]
+
+    def _price_batches(self):
+        """
+        Prices the option with NumPy, streaming the paths in batches and keeping only the raw moments of the payoffs
+
+        The batches run on a thread pool, each drawing from its own stream spawned from the seed sequence,
+        so the price does not depend on the number of threads.
+
+        Sobol points within a batch are not independent, so the standard error is taken over the batch means
+        (randomised quasi-Monte Carlo) rather than over the samples.
+        """
+        batches = self._batches()
+        n_samples = sum(batches)
+        max_workers = self.max_workers or os.cpu_count() or 1
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            moments = np.array(list(executor.map(self._batch_moments, batches, self.seed_sequence.spawn(len(batches)))))
+
+        price, std_error, beta = _estimate(n_samples, *moments.sum(axis=0), bool(self.control_variate))
+
+        if self.rng_method == "sobol":
+            if len(batches) < 2:
+                return price, math.nan
+
+            batch_means = (moments[:, 0] - beta * moments[:, 2]) / batches[0]
+            return price, math.sqrt(batch_means.var(ddof=1) / len(batches))
 
         return price, std_error
+
+    def _control_mean(self):
+        """Expectation S * exp(-qT) of the discounted terminal price, the control variate"""
+        return self.option.S * math.exp(-self.option.q * self.option.T)
+
+    def _n_samples(self):
+        """Number of independent samples, antithetic pairs of paths counting as one"""
+        return -(-self.n_paths // 2) if self.antithetic else self.n_paths
+
+    def price(self):
+        """Calculates the price of a European-style option"""
+        # The compiled kernel draws from the pseudo-random generators, Sobol points are priced with NumPy
+        if NUMBA_AVAILABLE and self.rng_method != "sobol":
+            # Batches are run in parallel, each drawing from a stream spawned from the seed sequence
+            n_samples = self._n_samples()
+            n_batches = -(-n_samples // self.BATCH_SIZE)
+            rngs = List([self._generator(seed_sequence) for seed_sequence in self.seed_sequence.spawn(n_batches)])
+
+            return _mc_european(
+                float(self.option.S), float(self.option.K), float(self.option.r), float(self.option.q),
+                float(self.option.sigma), float(self.option.T), n_samples, self.option.option_type == "call",
+                bool(self.antithetic), bool(self.control_variate), rngs, self.BATCH_SIZE
+            )
+
+        return self._price_batches()
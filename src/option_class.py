@@ -1,27 +1,33 @@
+import numpy as np
+from dataclasses import dataclass
+from typing import ClassVar
+
+@dataclass(frozen=True, slots=True)
 class Option:
-    VALID_OPTION_TYPES = ['call', 'put']
-
-    def __init__(self, option_type: str, S: float, K: float, T: float, sigma: float, r: float, q: float = 0):
-        """
-        Initialise paramters for an option
- 
-        :param option_type: Call or put
-        :param S: Current stock price
-        :param K: Strike price
-        :param T: Time to maturity in years
-        :param sigma: Volatility
-        :param r: Risk-free rate
-        :param q: Dividend yield rate
-        """
-        self.option_type = option_type
-        self.S = S
-        self.K = K
-        self.T = T
-        self.sigma = sigma
-        self.r = r
-        self.q = q
-
-        self._validate_inputs()
+    """
+    Parameters for an option
+
+    :param option_type: Call or put
+    :param S: Current stock price
+    :param K: Strike price
+    :param T: Time to maturity in years
+    :param sigma: Volatility
+    :param r: Risk-free rate
+    :param q: Dividend yield rate
+    """
+    VALID_OPTION_TYPES: ClassVar[list] = ['call', 'put']
+
+    option_type: str
+    S: float
+    K: float
+    T: float
+    sigma: float
+    r: float
+    q: float = 0
+
+    def __post_init__(self):
+        if __debug__:   # skipped under python -O
+            self._validate_inputs()
 
     def _validate_inputs(self):
         """Checks if the provided option parameters are valid"""
@@ -48,3 +54,39 @@ class Option:
                 'Dividend Yield': self.q
             }
         }
+
+def option_book(options):
+    """
+    Reads a book of options into structure-of-arrays form, one contiguous array per parameter
+
+    :param options: Dict of arrays, structured array or DataFrame with option_type, S, K, T, sigma, r and optionally q
+    :return: Dict of float arrays S, K, T, sigma, r, q and a boolean array is_call
+    """
+    try:
+        q = options['q']
+    except (KeyError, ValueError):  # structured arrays raise ValueError for a missing field
+        q = 0
+
+    # Scalar columns are broadcast across the book
+    option_types, *columns = np.atleast_1d(*np.broadcast_arrays(
+        np.asarray(options['option_type']), *(np.asarray(options[name], dtype=float) for name in ('S', 'K', 'T', 'sigma', 'r')),
+        np.asarray(q, dtype=float)
+    ))
+    # Copied, since the kernels take writable contiguous arrays and pandas hands out read-only views of its columns
+    book = {name: np.array(column, dtype=float, order='C') for name, column in zip(('S', 'K', 'T', 'sigma', 'r', 'q'), columns)}
+
+    invalid = ~np.isin(option_types, Option.VALID_OPTION_TYPES)
+    if invalid.any():
+        raise ValueError(f"Invalid option type '{option_types[invalid][0]}'. Must be {Option.VALID_OPTION_TYPES}")
+    book['is_call'] = option_types == "call"
+
+    if (book['S'] <= 0).any():
+        raise ValueError("Stock price must be greater than 0")
+    if (book['K'] <= 0).any():
+        raise ValueError("Strike price must be greater than 0")
+    if (book['T'] < 0).any():
+        raise ValueError("Time to maturity must be positive")
+    if (book['sigma'] <= 0).any():
+        raise ValueError("Volatility must be greater than 0")
+
+    return book